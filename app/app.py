@@ -1,14 +1,27 @@
 import dash
-from dash import dcc, html, callback_context
+from dash import dcc, html, callback_context, no_update
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 import plotly.graph_objs as go
+import plotly.express as px
 from flask import redirect
 from datetime import datetime
+import logging
+import numpy as np
 
 # Import widgets (will be developed later)
 from widgets import latency, decay, flow
 
+log = logging.getLogger(__name__)
+
+# Qualitative palettes used by the callbacks (resolved once, not per invocation)
+_PLOTLY_QUAL = px.colors.qualitative.Plotly
+_BOLD_QUAL = px.colors.qualitative.Bold
+_VIVID_QUAL = px.colors.qualitative.Vivid
+_T10_QUAL = px.colors.qualitative.T10
+_SET2_QUAL = px.colors.qualitative.Set2
+_SET3_QUAL = px.colors.qualitative.Set3
+
 # Initialize the Dash app
 app = dash.Dash(
     __name__,
@@ -152,7 +165,7 @@ def initialize_latency_widget(pathname):
 def update_latency_on_date_change(date_str):
     """Update latency widget when date is selected."""
     try:
-        print(f"[DEBUG] update_latency_on_date_change called with date_str={date_str}")
+        log.debug("update_latency_on_date_change called with date_str=%s", date_str)
         return latency.get_widget_content(date_str=date_str)
     except Exception as e:
         import traceback
@@ -184,34 +197,85 @@ def initialize_flow_widget(pathname):
             ])
     return html.Div()
 
+def _add_upnl_breakdown(fig, metrics_df, key_col, value_col, colors, dash, legend_state):
+    """
+    Add one UPNL line per distinct `key_col` value (summed over instruments) to pane 1.
+
+    The frame is partitioned once by a sorted (key, ts) groupby instead of an
+    equality scan of the key column per currency.
+    """
+    if key_col not in metrics_df.columns or value_col not in metrics_df.columns:
+        return
+
+    # Filter out None and NaN values before grouping; mask and project in one
+    # .loc so only the columns the groupby reads are copied
+    key = metrics_df[key_col]
+    mask = key.notna() & ~key.isin(['', 'None', 'nan'])
+    if not mask.any():
+        return
+
+    # Sum per (key, ts): sorted by key then ts, so each key's curve is one
+    # contiguous, time-ordered run of the result
+    grouped = metrics_df.loc[mask, [key_col, 'ts', value_col]].groupby(
+        [key_col, 'ts'], sort=True, observed=True)[value_col].sum()
+
+    for idx, (inst, data) in enumerate(grouped.groupby(level=0, sort=False)):
+        fig.add_trace(
+            go.Scatter(
+                x=data.index.get_level_values('ts').tz_convert(None).to_numpy(),
+                y=data.to_numpy(),
+                mode='lines',
+                name=f'UPNL {inst}',
+                line=dict(color=colors[idx % len(colors)], width=1.5, dash=dash),
+                hovertemplate=f'<b>%{{x}}</b><br>{inst} UPNL: $%{{y:,.2f}}<extra></extra>',
+                visible=True if legend_state.get(f'UPNL {inst}', True) else 'legendonly'
+            ),
+            row=1, col=1
+        )
+
+
 # Flow widget callback - Load button
 @app.callback(
     [Output('flow-graph', 'figure'),
      Output('flow-status', 'children'),
-     Output('flow-instrument-filter', 'options')],
+     Output('flow-instrument-filter', 'options'),
+     Output('flow-instrument-range', 'data')],
     Input('flow-load-button', 'n_clicks'),
     [State('flow-start-datetime', 'value'),
      State('flow-end-datetime', 'value'),
      State('flow-instrument-filter', 'value'),
-     State('flow-legend-state', 'data')],
+     State('flow-legend-state', 'data'),
+     State('flow-instrument-range', 'data')],
     prevent_initial_call=True
 )
-def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments, legend_state):
+def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments, legend_state,
+                   instrument_range):
     """Fetch flow metrics and plot them with two panes: PnL curves and Volume curves."""
     from plotly.subplots import make_subplots
 
     try:
-        print(f"[DEBUG] Loading flow data for datetime range: {start_datetime} to {end_datetime}")
-        print(f"[DEBUG] Selected instruments: {selected_instruments}")
-
-        # Fetch available instruments for the dropdown
-        available_instruments = flow._fetch_available_instruments(start_datetime, end_datetime)
-        instrument_options = [{'label': inst, 'value': inst} for inst in available_instruments]
+        log.debug("Loading flow data for datetime range: %s to %s, instruments=%s",
+                  start_datetime, end_datetime, selected_instruments)
 
         # Fetch flow metrics
         instruments_filter = selected_instruments if selected_instruments else None
         metrics_df = flow._fetch_flow_metrics(start_datetime, end_datetime, instruments=instruments_filter)
 
+        # Available instruments for the dropdown, unless the options already on
+        # the client were built for this exact range. Unfiltered metrics cover
+        # every instrument of the range, so their (sorted) categories are the
+        # list and no second query is needed
+        range_key = [start_datetime, end_datetime]
+        if instrument_range == range_key:
+            instrument_options = no_update
+        else:
+            if instruments_filter is None:
+                available_instruments = (metrics_df['instrument'].cat.categories.tolist()
+                                         if not metrics_df.empty else [])
+            else:
+                available_instruments = flow._fetch_available_instruments(start_datetime, end_datetime)
+            instrument_options = [{'label': inst, 'value': inst} for inst in available_instruments]
+
         if metrics_df.empty:
             fig = make_subplots(
                 rows=2, cols=1,
@@ -237,9 +301,9 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
                     )
                 ],
             )
-            return fig, f"No data found for {start_datetime} to {end_datetime}", instrument_options
+            return fig, f"No data found for {start_datetime} to {end_datetime}", instrument_options, range_key
 
-        print(f"[DEBUG] Found {len(metrics_df)} data points")
+        log.debug("Found %d data points", len(metrics_df))
 
         # Group by timestamp and aggregate across all instruments (if multiple)
         # When multiple instruments are selected, we sum their values at each timestamp
@@ -253,8 +317,6 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
             'num_deals': 'sum'
         }).reset_index()
 
-        print(f"[DEBUG] Aggregated metrics_df columns: {metrics_df.columns.tolist()}")
-
         # Create figure with 2 subplots (panes)
         # Second subplot has secondary y-axis for num_deals
         # shared_xaxes='all' synchronizes zooming and panning while keeping separate tick labels
@@ -270,12 +332,17 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
         if legend_state is None:
             legend_state = {}
 
+        # Shared x axis as a plain datetime64 array (UTC wall time), converted once.
+        # Handing Plotly the tz-aware Series makes it box every timestamp into a
+        # Python datetime again for each of the six traces below.
+        agg_ts = agg_df['ts'].dt.tz_convert(None).to_numpy()
+
         # === Pane 1: PnL curves ===
         # Add UPNL trace
         fig.add_trace(
             go.Scatter(
-                x=agg_df['ts'],
-                y=agg_df['upnl_usd'],
+                x=agg_ts,
+                y=agg_df['upnl_usd'].to_numpy(),
                 mode='lines',
                 name='UPNL',
                 line=dict(color='#3498db', width=2),
@@ -288,8 +355,8 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
         # Add RPNL trace (per bucket)
         fig.add_trace(
             go.Scatter(
-                x=agg_df['ts'],
-                y=agg_df['rpnl_usd_total'],
+                x=agg_ts,
+                y=agg_df['rpnl_usd_total'].to_numpy(),
                 mode='lines',
                 name='RPNL',
                 line=dict(color='#e74c3c', width=2),
@@ -302,8 +369,8 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
         # Add Total PnL trace (using tpnl_usd from database)
         fig.add_trace(
             go.Scatter(
-                x=agg_df['ts'],
-                y=agg_df['tpnl_usd'],
+                x=agg_ts,
+                y=agg_df['tpnl_usd'].to_numpy(),
                 mode='lines',
                 name='TPNL',
                 line=dict(color='#2ecc71', width=2.5),
@@ -313,80 +380,19 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
             row=1, col=1
         )
 
-        # Add UPNL breakdown by instrument_quote (one line per distinct instrument_quote)
-        if 'instrument_quote' in metrics_df.columns and 'upnl_quote' in metrics_df.columns:
-            # Filter out None and NaN values from instrument_quote before grouping
-            quote_df = metrics_df[metrics_df['instrument_quote'].notna() & (metrics_df['instrument_quote'] != '') & (metrics_df['instrument_quote'] != 'None')]
-
-            if not quote_df.empty:
-                # Group by ts and instrument_quote, summing upnl_quote for each
-                quote_grouped = quote_df.groupby(['ts', 'instrument_quote']).agg({
-                    'upnl_quote': 'sum'
-                }).reset_index()
-
-                # Get unique instrument_quote values (already filtered, but double-check)
-                unique_quote_instruments = sorted([x for x in quote_grouped['instrument_quote'].unique() if x and str(x) not in ['nan', 'None', '']])
-
-                # Create color palette for quote instruments
-                import plotly.express as px
-                quote_colors = px.colors.qualitative.Set2
-
-                for idx, quote_inst in enumerate(unique_quote_instruments):
-                    quote_data = quote_grouped[quote_grouped['instrument_quote'] == quote_inst]
-
-                    fig.add_trace(
-                        go.Scatter(
-                            x=quote_data['ts'],
-                            y=quote_data['upnl_quote'],
-                            mode='lines',
-                            name=f'UPNL {quote_inst}',
-                            line=dict(color=quote_colors[idx % len(quote_colors)], width=1.5, dash='dot'),
-                            hovertemplate=f'<b>%{{x}}</b><br>{quote_inst} UPNL: $%{{y:,.2f}}<extra></extra>',
-                            visible=True if legend_state.get(f'UPNL {quote_inst}', True) else 'legendonly'
-                        ),
-                        row=1, col=1
-                    )
-
-        # Add UPNL breakdown by instrument_base (one line per distinct instrument_base)
-        if 'instrument_base' in metrics_df.columns and 'upnl_base' in metrics_df.columns:
-            # Filter out None and NaN values from instrument_base before grouping
-            base_df = metrics_df[metrics_df['instrument_base'].notna() & (metrics_df['instrument_base'] != '') & (metrics_df['instrument_base'] != 'None')]
-
-            if not base_df.empty:
-                # Group by ts and instrument_base, summing upnl_base for each
-                base_grouped = base_df.groupby(['ts', 'instrument_base']).agg({
-                    'upnl_base': 'sum'
-                }).reset_index()
-
-                # Get unique instrument_base values (already filtered, but double-check)
-                unique_base_instruments = sorted([x for x in base_grouped['instrument_base'].unique() if x and str(x) not in ['nan', 'None', '']])
-
-                # Create color palette for base instruments
-                import plotly.express as px
-                base_colors = px.colors.qualitative.Set3
-
-                for idx, base_inst in enumerate(unique_base_instruments):
-                    base_data = base_grouped[base_grouped['instrument_base'] == base_inst]
-
-                    fig.add_trace(
-                        go.Scatter(
-                            x=base_data['ts'],
-                            y=base_data['upnl_base'],
-                            mode='lines',
-                            name=f'UPNL {base_inst}',
-                            line=dict(color=base_colors[idx % len(base_colors)], width=1.5, dash='dash'),
-                            hovertemplate=f'<b>%{{x}}</b><br>{base_inst} UPNL: $%{{y:,.2f}}<extra></extra>',
-                            visible=True if legend_state.get(f'UPNL {base_inst}', True) else 'legendonly'
-                        ),
-                        row=1, col=1
-                    )
+        # Add UPNL breakdown by instrument_quote / instrument_base (one line per
+        # distinct currency)
+        _add_upnl_breakdown(fig, metrics_df, 'instrument_quote', 'upnl_quote',
+                            _SET2_QUAL, 'dot', legend_state)
+        _add_upnl_breakdown(fig, metrics_df, 'instrument_base', 'upnl_base',
+                            _SET3_QUAL, 'dash', legend_state)
 
         # === Pane 2: Volume curves ===
         # Add Volume trace
         fig.add_trace(
             go.Scatter(
-                x=agg_df['ts'],
-                y=agg_df['vol_usd'],
+                x=agg_ts,
+                y=agg_df['vol_usd'].to_numpy(),
                 mode='lines',
                 name='Deal Volume',
                 line=dict(color='#9b59b6', width=2),
@@ -399,8 +405,8 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
         # Add Cumulative Cost trace
         fig.add_trace(
             go.Scatter(
-                x=agg_df['ts'],
-                y=agg_df['cum_cost_usd'],
+                x=agg_ts,
+                y=agg_df['cum_cost_usd'].to_numpy(),
                 mode='lines',
                 name='Inventory Value',
                 line=dict(color='#f39c12', width=2),
@@ -414,8 +420,8 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
         # Add Number of Deals trace on secondary y-axis
         fig.add_trace(
             go.Scatter(
-                x=agg_df['ts'],
-                y=agg_df['num_deals'],
+                x=agg_ts,
+                y=agg_df['num_deals'].to_numpy(),
                 mode='lines',
                 name='# Deals',
                 line=dict(color='#95a5a6', width=1.5, dash='dot'),
@@ -518,7 +524,7 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
             f"Deals: {total_deals:,}"
         ], style={'textAlign': 'left'})
 
-        return fig, status, instrument_options
+        return fig, status, instrument_options, range_key
 
     except Exception as e:
         import traceback
@@ -548,7 +554,7 @@ def load_flow_data(n_clicks, start_datetime, end_datetime, selected_instruments,
                 )
             ],
         )
-        return fig, f"Error: {str(e)}", []
+        return fig, f"Error: {str(e)}", [], None
 
 # Flow widget callback - Persist legend state
 @app.callback(
@@ -592,7 +598,7 @@ def update_legend_state(restyle_data, current_state):
 
         return current_state
     except Exception as e:
-        print(f"[DEBUG] Error updating legend state: {e}")
+        log.debug("Error updating legend state: %s", e)
         raise PreventUpdate
 
 @app.callback(
@@ -623,7 +629,8 @@ def initialize_decay_widget(pathname):
      Output('decay-orderkind-filter', 'options'),
      Output('decay-ordertype-filter', 'options'),
      Output('decay-tif-filter', 'options'),
-     Output('decay-status', 'children')],
+     Output('decay-status', 'children'),
+     Output('decay-filter-range', 'data')],
     [Input('decay-plot-button', 'n_clicks'),
      Input('decay-start-datetime', 'value'),
      Input('decay-end-datetime', 'value')],
@@ -633,26 +640,29 @@ def initialize_decay_widget(pathname):
      State('decay-orderkind-filter', 'value'),
      State('decay-ordertype-filter', 'value'),
      State('decay-tif-filter', 'value'),
-     State('decay-aggregate-dropdown', 'value')],
+     State('decay-aggregate-dropdown', 'value'),
+     State('decay-filter-range', 'data')],
     prevent_initial_call=True
 )
 def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
-                    instruments, sides, order_kinds, order_types, tifs, aggregate):
+                    instruments, sides, order_kinds, order_types, tifs, aggregate,
+                    filter_range):
     """Fetch filtered data and plot it."""
-    import pandas as pd
-    import numpy as np
-    import plotly.express as px
-    from dash import callback_context, no_update
-
     ctx = callback_context
     if not ctx.triggered:
-        return no_update, no_update, no_update, no_update, no_update, no_update, no_update
+        return no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update
 
     trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    range_key = [start_datetime, end_datetime]
 
     # If triggered by datetime change (Enter or Blur), only update filters
     if trigger_id in ['decay-start-datetime', 'decay-end-datetime']:
-        print(f"[DEBUG] Fetching filter options for {start_datetime} to {end_datetime}")
+        # Enter/blur re-submits the input even when the range did not move;
+        # the dropdowns already hold options for it, so skip the refetch
+        if filter_range == range_key:
+            raise PreventUpdate
+
+        log.debug("Fetching filter options for %s to %s", start_datetime, end_datetime)
         options = decay.get_filter_options(start_datetime, end_datetime)
 
         status = f"Filters updated for range {start_datetime} to {end_datetime}"
@@ -663,7 +673,8 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
             options.get('order_kinds', []),
             options.get('order_types', []),
             options.get('tifs', []),
-            status
+            status,
+            range_key
         )
     
     # Otherwise (Plot button), proceed with full data fetch and plot
@@ -672,16 +683,17 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
     yaxis_label = "Return" if view == "return" else "PnL, $"
     
     try:
-        print(f"[DEBUG] Plotting data for datetime range: {start_datetime} to {end_datetime}, view: {view}")
-        print(f"[DEBUG] Filters: instruments={instruments}, sides={sides}, order_kinds={order_kinds}, order_types={order_types}, tifs={tifs}")
-        print(f"[DEBUG] Aggregation mode: {aggregate}")
+        log.debug("Plotting data for datetime range: %s to %s, view: %s, aggregate: %s",
+                  start_datetime, end_datetime, view, aggregate)
+        log.debug("Filters: instruments=%s, sides=%s, order_kinds=%s, order_types=%s, tifs=%s",
+                  instruments, sides, order_kinds, order_types, tifs)
         
         # OPTIMIZATION: Use database aggregation for grouped views (99% less memory!)
         # Only fetch raw slices for 'none' (show all) mode
         use_db_aggregation = aggregate in ['instrument', 'side', 'day', 'hour']
         
         if use_db_aggregation:
-            print(f"[DEBUG] Using DATABASE aggregation (memory efficient!)")
+            log.debug("Using DATABASE aggregation")
             
             # Build filters dict
             filters_dict = {
@@ -692,13 +704,18 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
                 'tifs': tifs if tifs else []
             }
             
-            # Fetch pre-aggregated data from database
-            agg_df = decay._fetch_aggregated_slices(
+            # Fetch pre-aggregated data from database and, concurrently, the deals
+            # for filter options (much smaller query) - only the filter columns
+            # are needed here, the plot comes from agg_df
+            f_agg = decay._EXECUTOR.submit(
+                decay._fetch_aggregated_slices,
                 start_datetime, end_datetime, view, aggregate, filters_dict
             )
-            
-            # Also fetch deals for filter options (much smaller query)
-            deals_df = decay._fetch_deals(start_datetime, end_datetime)
+            f_deals = decay._EXECUTOR.submit(
+                decay._fetch_deals, start_datetime, end_datetime, columns=decay.FILTER_COLUMNS
+            )
+            agg_df = f_agg.result()
+            deals_df = f_deals.result()
             
             if deals_df.empty or agg_df.empty:
                 fig = go.Figure()
@@ -719,9 +736,9 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
                         )
                     ],
                 )
-                return fig, [], [], [], [], [], f"No deals found for {start_datetime} to {end_datetime}"
+                return fig, [], [], [], [], [], f"No deals found for {start_datetime} to {end_datetime}", None
             
-            print(f"[DEBUG] Fetched {len(agg_df)} aggregated rows (vs millions of raw slices!)")
+            log.debug("Fetched %d aggregated rows", len(agg_df))
             
         else:
             # 'none' mode - show all individual lines
@@ -750,13 +767,22 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
                         )
                     ],
                 )
-                return fig, [], [], [], [], [], f"'Show all' mode limited to 3 days (you selected {num_days} days)"
-            
-            print(f"[DEBUG] Using PYTHON aggregation (fetching all slices...)")
-            
-            # Fetch data for the datetime range
-            deals_df, slices_dict = decay._build_dataset(start_datetime, end_datetime, view=view)
-            print(f"[DEBUG] Dataset fetched successfully")
+                return fig, [], [], [], [], [], f"'Show all' mode limited to 3 days (you selected {num_days} days)", None
+            
+            log.debug("Using PYTHON aggregation (fetching all slices)")
+            
+            # Fetch data for the datetime range; the filters are pushed down so
+            # slices are only fetched for the selected deals
+            deals_df, slices_df = decay._build_dataset(
+                start_datetime, end_datetime, view=view,
+                filters={
+                    'instruments': instruments,
+                    'sides': sides,
+                    'order_kinds': order_kinds,
+                    'order_types': order_types,
+                    'tifs': tifs,
+                }
+            )
             
             if deals_df.empty:
                 fig = go.Figure()
@@ -777,50 +803,22 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
                         )
                     ],
                 )
-                return fig, [], [], [], [], [], f"No deals found for {start_datetime} to {end_datetime}"
+                return fig, [], [], [], [], [], f"No deals found for {start_datetime} to {end_datetime}", None
             
-            print(f"[DEBUG] Found {len(deals_df)} deals, {len(slices_dict)} slices")
+            log.debug("Found %d deals, %d slice rows", len(deals_df), len(slices_df))
         
         # Generate filter options from ALL data (before filtering)
-        all_instruments = [{'label': inst, 'value': inst} for inst in sorted(deals_df['instrument'].unique())]
-        all_sides = [{'label': side, 'value': side} for side in sorted(deals_df['side'].unique())]
-        all_order_kinds = [{'label': ok, 'value': ok} for ok in sorted(deals_df['orderKind'].dropna().unique())]
-        all_order_types = [{'label': ot, 'value': ot} for ot in sorted(deals_df['orderType'].dropna().unique())]
-        all_tifs = [{'label': tif, 'value': tif} for tif in sorted(deals_df['tif'].dropna().unique())]
+        options = decay._filter_options(deals_df)
+        all_instruments = options['instruments']
+        all_sides = options['sides']
+        all_order_kinds = options['order_kinds']
+        all_order_types = options['order_types']
+        all_tifs = options['tifs']
         
-        # For DB aggregation mode, we already have filtered data
-        if use_db_aggregation:
-            # Apply filters to deals for display purposes only
-            mask = pd.Series([True] * len(deals_df))
-            if instruments:
-                mask &= deals_df['instrument'].isin(instruments)
-            if sides:
-                mask &= deals_df['side'].isin(sides)
-            if order_kinds:
-                mask &= deals_df['orderKind'].isin(order_kinds)
-            if order_types:
-                mask &= deals_df['orderType'].isin(order_types)
-            if tifs:
-                mask &= deals_df['tif'].isin(tifs)
-            
-            filtered_deals = deals_df[mask]
-            print(f"[DEBUG] After filtering: {len(filtered_deals)} deals")
-        else:
-            # Apply filters to deals for Python aggregation
-            mask = pd.Series([True] * len(deals_df))
-            if instruments:
-                mask &= deals_df['instrument'].isin(instruments)
-            if sides:
-                mask &= deals_df['side'].isin(sides)
-            if order_kinds:
-                mask &= deals_df['orderKind'].isin(order_kinds)
-            if order_types:
-                mask &= deals_df['orderType'].isin(order_types)
-            if tifs:
-                mask &= deals_df['tif'].isin(tifs)
-            
-            filtered_deals = deals_df[mask]
-            print(f"[DEBUG] After filtering: {len(filtered_deals)} deals")
+        # Filter the deals once for both paths: in DB aggregation mode it only
+        # drives the status counts, in 'none' mode it selects the slices to plot
+        filtered_deals = decay._filter_deals(deals_df, instruments, sides, order_kinds, order_types, tifs)
+        log.debug("After filtering: %d deals", len(filtered_deals))
         
         if filtered_deals.empty:
             fig = go.Figure()
@@ -842,113 +840,40 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
                 ],
             )
             status = f"Loaded {len(deals_df)} deals, 0 match filters"
-            return fig, all_instruments, all_sides, all_order_kinds, all_order_types, all_tifs, status
+            return fig, all_instruments, all_sides, all_order_kinds, all_order_types, all_tifs, status, range_key
         
         # Create figure
         fig = go.Figure()
         
-        # Create color map for instruments
-        unique_instruments = sorted(filtered_deals['instrument'].unique())
-        colors = px.colors.qualitative.Plotly
-        color_map = {inst: colors[i % len(colors)] for i, inst in enumerate(unique_instruments)}
-        
-        # Track which instruments have been added to legend
-        legend_added = set()
-        
-        # Select the correct column based on view
-        y_column = 'pnl_usd' if view == 'usd_pnl' else 'ret'
-        
         traces_added = 0
         
-        # Helper function to compute weighted average using pandas (optimized)
-        def compute_weighted_avg_pandas(group_deals, group_name, group_value):
-            """Compute weighted average for a group using efficient pandas operations."""
-            import time
-            import gc
-            start_time = time.time()
-            
-            # Filter slices_dict to only include deals in this group (avoid iteration)
-            group_indices = set(group_deals.index)
-            relevant_slices = {idx: slices_dict[idx] for idx in group_indices if idx in slices_dict and not slices_dict[idx].empty}
-            
-            if not relevant_slices:
-                return None, None
-            
-            # OPTIMIZED: Build lists more efficiently using list comprehensions
-            # This reduces memory fragmentation compared to repeated extend() calls
-            all_data = []
-            for idx, slice_df in relevant_slices.items():
-                deal = group_deals.loc[idx]
-                weight = deal['amt_usd'] if 'amt_usd' in deal and pd.notna(deal['amt_usd']) else 0.0
-                
-                if weight > 0:
-                    # Extract arrays directly (faster than copying DataFrame)
-                    t_arr = slice_df['t_from_deal'].values
-                    y_arr = slice_df[y_column].values
-                    
-                    # Build tuples for this slice
-                    for t, y in zip(t_arr, y_arr):
-                        all_data.append((t, y, weight))
-            
-            if not all_data:
-                return None, None
-            
-            # Create DataFrame from list of tuples (more memory efficient)
-            combined = pd.DataFrame(all_data, columns=['t_from_deal', y_column, 'weight'])
-            
-            # Free intermediate data
-            del all_data
-            gc.collect()
-            
-            print(f"[DEBUG] {group_name}={group_value}: Built combined DataFrame with {len(combined)} rows from {len(relevant_slices)} deals")
-            
-            # Compute weighted average at each t_from_deal using pandas groupby
-            # Formula: weighted_avg = sum(value * weight) / sum(weight)
-            combined['weighted_value'] = combined[y_column] * combined['weight']
-            
-            grouped = combined.groupby('t_from_deal', sort=True).agg({
-                'weighted_value': 'sum',
-                'weight': 'sum'
-            })
-            
-            grouped['weighted_avg'] = grouped['weighted_value'] / grouped['weight']
-            
-            # Free combined DataFrame
-            del combined
-            gc.collect()
-            
-            elapsed = time.time() - start_time
-            print(f"[DEBUG] {group_name}={group_value}: Computed weighted avg in {elapsed:.2f}s")
-            
-            return grouped.index.tolist(), grouped['weighted_avg'].tolist()
-        
         if use_db_aggregation:
             # Plot directly from database-aggregated results (FAST!)
-            print(f"[DEBUG] Plotting from database-aggregated data")
+            log.debug("Plotting from database-aggregated data")
             
             # Group by the group_key column
-            unique_groups = sorted(agg_df['group_key'].unique())
             
             # Color palettes based on aggregation type
             if aggregate == 'instrument':
-                colors_palette = px.colors.qualitative.Bold
+                colors_palette = _BOLD_QUAL
             elif aggregate == 'side':
                 colors_palette = {'buy': '#00D9FF', 'BUY': '#00D9FF', 'sell': '#FF6B9D', 'SELL': '#FF6B9D'}
             elif aggregate == 'day':
-                colors_palette = px.colors.qualitative.Vivid
+                colors_palette = _VIVID_QUAL
             elif aggregate == 'hour':
-                colors_palette = px.colors.qualitative.T10
+                colors_palette = _T10_QUAL
             else:
-                colors_palette = px.colors.qualitative.Plotly
-            
-            for idx, group_val in enumerate(unique_groups):
-                group_data = agg_df[agg_df['group_key'] == group_val]
-                
-                # Extract x and y data
-                x_data = group_data['t_from_deal'].tolist()
-                y_data = group_data['weighted_avg'].tolist()
+                colors_palette = _PLOTLY_QUAL
+            
+            # Partition agg_df in a single groupby pass (sorted keys) rather than
+            # re-scanning group_key with an equality mask for every group
+            for idx, (group_val, group_data) in enumerate(agg_df.groupby('group_key', sort=True)):
+                # Extract x and y as NumPy arrays: Plotly serializes ndarrays as
+                # packed typed arrays instead of per-element JSON lists
+                x_data = group_data['t_from_deal'].to_numpy()
+                y_data = group_data['weighted_avg'].to_numpy()
                 
-                if not x_data or not y_data:
+                if not len(x_data) or not len(y_data):
                     continue
                 
                 # Get color
@@ -963,8 +888,8 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
                 else:
                     group_name = str(group_val)
                 
-                # Add trace
-                fig.add_trace(go.Scatter(
+                # Add trace (WebGL, same renderer as the show-all traces)
+                fig.add_trace(go.Scattergl(
                     x=x_data,
                     y=y_data,
                     mode='lines',
@@ -977,188 +902,55 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
                 ))
                 traces_added += 1
             
-            print(f"[DEBUG] Added {traces_added} traces from database aggregation")
-            
-        elif aggregate == 'instrument':
-            # Weighted average by amt_usd per instrument
-            # Use Bold color palette for instruments
-            inst_colors = px.colors.qualitative.Bold
-            inst_color_map = {inst: inst_colors[i % len(inst_colors)] for i, inst in enumerate(unique_instruments)}
-            
-            for instrument in unique_instruments:
-                inst_deals = filtered_deals[filtered_deals['instrument'] == instrument]
-                
-                all_t, weighted_avg_y = compute_weighted_avg_pandas(inst_deals, 'instrument', instrument)
-                
-                if all_t is None:
-                    continue
-                
-                # Plot the weighted average line for this instrument
-                fig.add_trace(go.Scatter(
-                    x=all_t,
-                    y=weighted_avg_y,
-                    mode='lines',
-                    name=f"{instrument}",
-                    legendgroup=instrument,
-                    showlegend=True,
-                    opacity=0.9,
-                    line=dict(width=2.5, color=inst_color_map.get(instrument, '#636EFA')),
-                    hovertemplate=f"<b>{instrument}</b><br>t=%{{x}}s<br>y=%{{y:.4f}}<extra></extra>"
-                ))
-                traces_added += 1
-                
-        elif aggregate == 'side':
-            # Weighted average by amt_usd per side
-            unique_sides = sorted(filtered_deals['side'].unique())
-            # Use more vibrant colors for buy/sell
-            side_colors = {
-                'buy': '#00D9FF', 'BUY': '#00D9FF',  # Bright cyan for buy
-                'sell': '#FF6B9D', 'SELL': '#FF6B9D'  # Bright pink for sell
-            }
-            
-            for side in unique_sides:
-                side_deals = filtered_deals[filtered_deals['side'] == side]
-                
-                all_t, weighted_avg_y = compute_weighted_avg_pandas(side_deals, 'side', side)
-                
-                if all_t is None:
-                    continue
-                
-                # Plot the weighted average line for this side
-                fig.add_trace(go.Scatter(
-                    x=all_t,
-                    y=weighted_avg_y,
-                    mode='lines',
-                    name=f"{side}",
-                    legendgroup=side,
-                    showlegend=True,
-                    opacity=0.9,
-                    line=dict(width=2.5, color=side_colors.get(side, '#636EFA')),
-                    hovertemplate=f"<b>{side}</b><br>t=%{{x}}s<br>y=%{{y:.4f}}<extra></extra>"
-                ))
-                traces_added += 1
-                
-        elif aggregate == 'day':
-            # Weighted average by amt_usd per day
-            # OPTIMIZED: Add 'day' column directly instead of copying entire DataFrame
-            filtered_deals['day'] = pd.to_datetime(filtered_deals['time']).dt.date
-            unique_days = sorted(filtered_deals['day'].unique())
-            
-            # Create color map for days - use Vivid palette for vibrant colors
-            day_colors = px.colors.qualitative.Vivid
-            day_color_map = {day: day_colors[i % len(day_colors)] for i, day in enumerate(unique_days)}
-            
-            for day in unique_days:
-                day_deals = filtered_deals[filtered_deals['day'] == day]
-                
-                all_t, weighted_avg_y = compute_weighted_avg_pandas(day_deals, 'day', day)
-                
-                if all_t is None:
-                    continue
-                
-                # Plot the weighted average line for this day
-                fig.add_trace(go.Scatter(
-                    x=all_t,
-                    y=weighted_avg_y,
-                    mode='lines',
-                    name=f"{day}",
-                    legendgroup=str(day),
-                    showlegend=True,
-                    opacity=0.9,
-                    line=dict(width=2.5, color=day_color_map.get(day, '#636EFA')),
-                    hovertemplate=f"<b>{day}</b><br>t=%{{x}}s<br>y=%{{y:.4f}}<extra></extra>"
-                ))
-                traces_added += 1
-            
-            # Clean up temporary column
-            filtered_deals.drop(columns=['day'], inplace=True)
-                
-        elif aggregate == 'hour':
-            # Weighted average by amt_usd per hour
-            # OPTIMIZED: Add 'hour' column directly instead of copying entire DataFrame
-            filtered_deals['hour'] = pd.to_datetime(filtered_deals['time']).dt.hour
-            unique_hours = sorted(filtered_deals['hour'].unique())
-            
-            # Create color map for hours - use T10 palette for vibrant colors
-            hour_colors = px.colors.qualitative.T10
-            hour_color_map = {hour: hour_colors[i % len(hour_colors)] for i, hour in enumerate(unique_hours)}
-            
-            for hour in unique_hours:
-                hour_deals = filtered_deals[filtered_deals['hour'] == hour]
-                
-                all_t, weighted_avg_y = compute_weighted_avg_pandas(hour_deals, 'hour', hour)
-                
-                if all_t is None:
-                    continue
-                
-                # Plot the weighted average line for this hour
-                fig.add_trace(go.Scatter(
-                    x=all_t,
-                    y=weighted_avg_y,
-                    mode='lines',
-                    name=f"Hour {hour:02d}",
-                    legendgroup=f"hour_{hour}",
-                    showlegend=True,
-                    opacity=0.9,
-                    line=dict(width=2.5, color=hour_color_map.get(hour, '#636EFA')),
-                    hovertemplate=f"<b>Hour {hour:02d}</b><br>t=%{{x}}s<br>y=%{{y:.4f}}<extra></extra>"
-                ))
-                traces_added += 1
+            log.debug("Added %d traces from database aggregation", traces_added)
             
-            # Clean up temporary column
-            filtered_deals.drop(columns=['hour'], inplace=True)
         else:
             # No aggregation - show all individual lines
             # OPTIMIZATION: Batch all deals per instrument into single trace with NaN separators
             # This is MUCH faster than creating 1,500 individual traces!
-            print(f"[DEBUG] Batching {len(filtered_deals)} deals into traces by instrument")
+            log.debug("Batching %d deals into traces by instrument", len(filtered_deals))
             
             import time
             start_time = time.time()
             
-            # Group deals by instrument
+            # Create color map for instruments
+            unique_instruments = sorted(filtered_deals['instrument'].unique())
+            color_map = {inst: _PLOTLY_QUAL[i % len(_PLOTLY_QUAL)] for i, inst in enumerate(unique_instruments)}
+            
+            # slices_df is one tall frame with each deal's rows contiguous: split
+            # it by instrument once and put a NaN gap after every deal's run
+            inst_slices = slices_df.groupby('instrument', observed=True, sort=True)
             for instrument in unique_instruments:
-                inst_deals = filtered_deals[filtered_deals['instrument'] == instrument]
-                
-                # Collect all x and y data for this instrument with NaN separators
-                all_x = []
-                all_y = []
-                
-                for idx in inst_deals.index:
-                    if idx in slices_dict:
-                        slice_df = slices_dict[idx]
-                        
-                        if slice_df.empty or y_column not in slice_df.columns:
-                            continue
-                        
-                        # Append this deal's data
-                        all_x.extend(slice_df['t_from_deal'].tolist())
-                        all_y.extend(slice_df[y_column].tolist())
-                        
-                        # Add NaN separator to create gap between deals
-                        all_x.append(None)
-                        all_y.append(None)
+                if instrument not in inst_slices.groups:
+                    continue
+                part = inst_slices.get_group(instrument)
+                deal_ids = part['deal_id'].to_numpy()
+                run_ends = np.r_[np.flatnonzero(deal_ids[1:] != deal_ids[:-1]) + 1, len(deal_ids)]
+                x = np.insert(part['t_from_deal'].to_numpy(dtype=np.float32), run_ends, np.nan)
+                y = np.insert(part['value'].to_numpy(), run_ends, np.nan)
                 
-                if all_x and all_y:
-                    # Create single trace for all deals of this instrument
-                    fig.add_trace(go.Scatter(
-                        x=all_x,
-                        y=all_y,
-                        mode='lines',
-                        name=instrument,
-                        legendgroup=instrument,
-                        showlegend=True,
-                        opacity=0.6,
-                        line=dict(width=1.5, color=color_map.get(instrument, '#636EFA')),
-                        hovertemplate=f"<b>{instrument}</b><br>t=%{{x}}s<br>y=%{{y:.4f}}<extra></extra>",
-                        connectgaps=False  # Don't connect across NaN gaps
-                    ))
-                    traces_added += 1
+                # Create single trace for all deals of this instrument
+                # OPTIMIZATION: WebGL trace - tens of thousands of points per
+                # instrument render on the GPU instead of as SVG paths
+                fig.add_trace(go.Scattergl(
+                    x=x,
+                    y=y,
+                    mode='lines',
+                    name=instrument,
+                    legendgroup=instrument,
+                    showlegend=True,
+                    opacity=0.6,
+                    line=dict(width=1.5, color=color_map.get(instrument, '#636EFA')),
+                    hovertemplate=f"<b>{instrument}</b><br>t=%{{x}}s<br>y=%{{y:.4f}}<extra></extra>",
+                    connectgaps=False  # Don't connect across NaN gaps
+                ))
+                traces_added += 1
             
             elapsed = time.time() - start_time
-            print(f"[DEBUG] Created {traces_added} batched traces in {elapsed:.2f}s (vs {len(filtered_deals)} individual traces)")
+            log.debug("Created %d batched traces in %.2fs (vs %d individual traces)",
+                      traces_added, elapsed, len(filtered_deals))
         
-        print(f"[DEBUG] Added {traces_added} traces to graph")
+        log.debug("Added %d traces to graph", traces_added)
         
         # Add reference lines at x=0 and y=0
         if traces_added > 0:
@@ -1194,7 +986,7 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
         import gc
         gc.collect()
         
-        return fig, all_instruments, all_sides, all_order_kinds, all_order_types, all_tifs, status
+        return fig, all_instruments, all_sides, all_order_kinds, all_order_types, all_tifs, status, range_key
         
     except Exception as e:
         import traceback
@@ -1218,7 +1010,7 @@ def plot_decay_data(n_clicks, start_datetime, end_datetime, view,
                 )
             ],
         )
-        return fig, [], [], [], [], [], f"Error: {str(e)}"
+        return fig, [], [], [], [], [], f"Error: {str(e)}", None
 
 
 
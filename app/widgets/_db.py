@@ -0,0 +1,159 @@
+"""
+Shared QuestDB access for the Dash widgets.
+
+One ThreadedConnectionPool serves the PG-wire queries of every widget, so a
+page render reuses warm connections whichever widgets it touches. Bulk
+results are streamed through QuestDB's HTTP /exp endpoint instead.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import requests
+from psycopg2.pool import ThreadedConnectionPool
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# QuestDB connection settings
+# ---------------------------------------------------------------------------
+QUESTDB_HOST = os.getenv("QUESTDB_HOST", "16.171.14.188")
+QUESTDB_PORT = int(os.getenv("QUESTDB_PG_PORT", "8812"))
+QUESTDB_HTTP_PORT = int(os.getenv("QUESTDB_HTTP_PORT", "9000"))
+QUESTDB_USER = os.getenv("QUESTDB_USER", "admin")
+QUESTDB_PASSWORD = os.getenv("QUESTDB_PASSWORD", "quest")
+QUESTDB_DB = os.getenv("QUESTDB_DB", "qdb")
+
+# Timestamp literal format QuestDB uses for TIMESTAMP values
+QDB_TS_FMT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+# Connection pool bounds: maxconn covers the decay fetch executor plus the
+# concurrent callbacks of all widgets (getconn fails rather than waits)
+POOL_MIN_CONN = int(os.getenv("QUESTDB_POOL_MIN_CONN", "2"))
+POOL_MAX_CONN = int(os.getenv("QUESTDB_POOL_MAX_CONN", "16"))
+
+_POOL: Optional[ThreadedConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Return the shared QuestDB connection pool, creating it on first use."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ThreadedConnectionPool(
+                    POOL_MIN_CONN,
+                    POOL_MAX_CONN,
+                    host=QUESTDB_HOST,
+                    port=QUESTDB_PORT,
+                    user=QUESTDB_USER,
+                    password=QUESTDB_PASSWORD,
+                    database=QUESTDB_DB,
+                    connect_timeout=30,
+                )
+    return _POOL
+
+
+def run_query(sql: str, params: Sequence = (), dtype: Optional[dict] = None) -> pd.DataFrame:
+    """Execute a SQL query against QuestDB and return a pandas DataFrame.
+
+    Columns named in `dtype` are built column-wise straight into arrays of the
+    given numpy dtype (e.g. datetime64[us], float64), skipping the object
+    arrays and per-column type inference of DataFrame.from_records.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        # Plain tuple cursor: columns come from cursor.description, so no
+        # per-row dict is built before the DataFrame
+        with conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            # Bound SQL is only decoded when debug logging is on
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("SQL: %s", cur.query.decode())
+            rows = cur.fetchall()
+            columns = [d[0] for d in cur.description]
+    finally:
+        # Drop connections the server closed instead of handing them out again
+        pool.putconn(conn, close=bool(conn.closed))
+    if not dtype or not rows:
+        return pd.DataFrame.from_records(rows, columns=columns)
+    return pd.DataFrame({
+        col: np.array(values, dtype=dtype[col]) if col in dtype else values
+        for col, values in zip(columns, zip(*rows))
+    })
+
+
+def run_export(sql: str, dtype: Optional[dict] = None) -> pd.DataFrame:
+    """Run a query through QuestDB's HTTP /exp endpoint and parse the CSV stream.
+
+    For bulk numeric results this skips the per-row Python objects of the PG
+    wire path: the CSV is parsed by Arrow's multithreaded reader into columnar
+    buffers and handed to pandas as typed columns.
+    """
+    resp = requests.get(
+        f"http://{QUESTDB_HOST}:{QUESTDB_HTTP_PORT}/exp",
+        params={"query": sql},
+        stream=True,
+        timeout=30,
+    )
+    resp.raise_for_status()
+    resp.raw.decode_content = True
+    log.debug("SQL: %s", sql)
+    return pd.read_csv(resp.raw, dtype=dtype, engine="pyarrow")
+
+
+def fetch_latest_date(table: str, ts_column: str) -> Optional[str]:
+    """Fetch the most recent date (YYYY-MM-DD) present in `table`."""
+    # max() of the designated timestamp is answered from partition metadata,
+    # unlike a DISTINCT over the whole history
+    df = run_query(f"SELECT max({ts_column}) AS ts FROM {table}")
+    if df.empty or pd.isna(df["ts"].iloc[0]):
+        return None
+    return pd.Timestamp(df["ts"].iloc[0]).date().isoformat()
+
+
+# ---------------------------------------------------------------------------
+# Query parameter helpers
+# ---------------------------------------------------------------------------
+def sql_str(value: str) -> str:
+    """Quote a string literal for SQL that cannot use bind parameters."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+@lru_cache(maxsize=256)
+def parse_dt(dt_str: str) -> datetime:
+    """
+    Parse a 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD' string into a naive UTC datetime.
+
+    QuestDB timestamps are UTC; a naive value is sent as a plain TIMESTAMP
+    parameter. Cached because callbacks re-send the same few range bounds.
+    """
+    dt_str = dt_str.strip()
+    # Try datetime format first
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(dt_str, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Cannot parse datetime: {dt_str}")
+
+
+@lru_cache(maxsize=512)
+def fmt_questdb_ts(dt_str: str) -> str:
+    """Parse a range bound and format it as a QuestDB timestamp literal (cached)."""
+    return parse_dt(dt_str).strftime(QDB_TS_FMT)
+
+
+def ttl_bucket(ttl_seconds: int) -> int:
+    """Current cache time bucket; rotates every `ttl_seconds`."""
+    return int(time.time() // ttl_seconds)
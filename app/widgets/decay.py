@@ -9,14 +9,29 @@ Refactored to use precomputed tables:
 from dash import html, dcc
 import os
 import gc
-from datetime import date, timedelta
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import List, Optional, Sequence
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import psycopg2
-from psycopg2.extras import RealDictCursor
+
+from ._db import (
+    fetch_latest_date as _fetch_latest_date,
+    fmt_questdb_ts as _fmt_questdb_ts,
+    parse_dt as _parse_dt,
+    run_export as _run_export,
+    run_query as _run_query,
+    sql_str as _sql_str,
+    ttl_bucket as _ttl_bucket,
+)
+
+log = logging.getLogger(__name__)
 
 
 # ---------------------------------------------------------------------------
@@ -25,157 +40,139 @@ from psycopg2.extras import RealDictCursor
 DEALS_TABLE = "mart_kraken_decay_deals"
 SLICES_TABLE = "mart_kraken_decay_slices"
 
+# Deal columns: full projection and the subset backing the filter dropdowns
+DEAL_COLUMNS = ("time", "instrument", "side", "amt", "px", "orderKind", "orderType", "tif", "orderStatus", "amt_usd")
+FILTER_COLUMNS = ("instrument", "side", "orderKind", "orderType", "tif")
+# What the per-deal (show all) view reads: the slice join key plus the filters
+PLOT_DEAL_COLUMNS = ("time",) + FILTER_COLUMNS
+CATEGORY_COLUMNS = FILTER_COLUMNS + ("orderStatus",)
+# Typed deal columns, built straight into numpy arrays by _run_query
+DEAL_DTYPES = {"time": "datetime64[us]", "amt": np.float64, "px": np.float64, "amt_usd": np.float64}
+# Tall slices frame returned by _build_dataset
+SLICE_FRAME_COLUMNS = ("deal_id", "instrument", "t_from_deal", "value")
+
 
 # ---------------------------------------------------------------------------
-# QuestDB connection helpers
+# QuestDB query helpers
 # ---------------------------------------------------------------------------
-QUESTDB_HOST = os.getenv("QUESTDB_HOST", "16.171.14.188")
-QUESTDB_PORT = int(os.getenv("QUESTDB_PG_PORT", "8812"))
-QUESTDB_USER = os.getenv("QUESTDB_USER", "admin")
-QUESTDB_PASSWORD = os.getenv("QUESTDB_PASSWORD", "quest")
-QUESTDB_DB = os.getenv("QUESTDB_DB", "qdb")
-VERBOSE = False
-
-
-def _connect():
-    """Create a new psycopg2 connection to QuestDB's Postgres endpoint."""
-    return psycopg2.connect(
-        host=QUESTDB_HOST,
-        port=QUESTDB_PORT,
-        user=QUESTDB_USER,
-        password=QUESTDB_PASSWORD,
-        database=QUESTDB_DB,
-        connect_timeout=30,
-    )
-
+# Shared pool for independent queries (psycopg2 releases the GIL while waiting
+# on the socket; each task borrows its own pooled connection)
+FETCH_MAX_WORKERS = int(os.getenv("DECAY_FETCH_MAX_WORKERS", "4"))
+_EXECUTOR = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="decay-fetch")
 
-def _run_query(sql: str, params: Sequence = ()) -> pd.DataFrame:
-    """Execute a SQL query against QuestDB and return a pandas DataFrame."""
-    with _connect() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(sql, params)
-        if VERBOSE:
-            print("[DEBUG SQL]", cur.query.decode())
-        rows = cur.fetchall()
-    return pd.DataFrame(rows)
+# Lifetime of cached latest date / filter options / deals (seconds)
+CACHE_TTL_SECONDS = int(os.getenv("DECAY_CACHE_TTL_SECONDS", "60"))
+# Distinct (range, projection) deal frames kept in memory
+DEALS_CACHE_SIZE = int(os.getenv("DECAY_DEALS_CACHE_SIZE", "8"))
 
 
-def _fetch_available_dates() -> List[str]:
-    """Fetch list of available dates from the deals datamart."""
-    sql = f"""
-        SELECT DISTINCT CAST(DATE_TRUNC('day', time) AS DATE) as date
-        FROM {DEALS_TABLE}
-        ORDER BY date DESC
-    """
-    df = _run_query(sql)
-    if df.empty:
-        return []
-    # Convert to datetime and extract date part to ensure YYYY-MM-DD format
-    dates = pd.to_datetime(df["date"]).dt.date
-    return [d.isoformat() for d in dates]
+@lru_cache(maxsize=32)
+def _latest_date_cached(bucket: int) -> Optional[str]:
+    """Latest deals date memoized per time bucket."""
+    return _fetch_latest_date(DEALS_TABLE, "time")
 
 
 def _date_range(start: date, end: date) -> List[date]:
     """Generate list of dates from start to end inclusive."""
-    dates = []
-    current = start
-    while current <= end:
-        dates.append(current)
-        current += timedelta(days=1)
-    return dates
-
-
-def _fetch_deals(start_datetime: str, end_datetime: str) -> pd.DataFrame:
-    """Fetch all deals for a given datetime range from the precomputed deals table."""
-    # Parse datetime strings - support both date and datetime formats
-    def parse_datetime(dt_str: str) -> datetime:
-        dt_str = dt_str.strip()
-        # Try datetime format first
-        for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']:
-            try:
-                dt = datetime.strptime(dt_str, fmt)
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                return dt
-            except ValueError:
-                continue
-        raise ValueError(f"Cannot parse datetime: {dt_str}")
-    
-    dt_start = parse_datetime(start_datetime)
-    dt_end = parse_datetime(end_datetime)
+    return list(pd.date_range(start, end, freq='D').date)
+
+
+def _fetch_deals(start_datetime: str, end_datetime: str,
+                 columns: Sequence[str] = DEAL_COLUMNS, distinct: bool = False) -> pd.DataFrame:
+    """
+    Fetch deals for a given datetime range from the precomputed deals table.
+
+    Only `columns` are selected, so callers that just need filter values can
+    skip the numeric and timestamp columns entirely. With `distinct=True` the
+    de-duplication runs in QuestDB and only the distinct combinations are
+    returned.
+
+    Results are cached per time bucket, so filter changes and Load clicks on
+    the same range within CACHE_TTL_SECONDS do not hit QuestDB again. The
+    caller gets its own copy and may modify it freely.
+    """
+    return _fetch_deals_cached(start_datetime, end_datetime, tuple(columns),
+                               distinct, _ttl_bucket(CACHE_TTL_SECONDS)).copy()
 
-    # Format timestamps for QuestDB (YYYY-MM-DDTHH:MM:SS.ffffffZ)
-    fmt = '%Y-%m-%dT%H:%M:%S.%fZ'
-    ts_start_str = dt_start.strftime(fmt)
-    ts_end_str = dt_end.strftime(fmt)
 
-    # Build SQL query
+@lru_cache(maxsize=DEALS_CACHE_SIZE)
+def _fetch_deals_cached(start_datetime: str, end_datetime: str, columns: tuple,
+                        distinct: bool, bucket: int) -> pd.DataFrame:
+    """_fetch_deals memoized per time bucket; never modify the returned frame."""
+    # Native datetimes are adapted by psycopg2 directly, no string round-trip
+    dt_start = _parse_dt(start_datetime)
+    dt_end = _parse_dt(end_datetime)
+
+    # Build SQL query (only order by time when it is projected)
+    order_by = "ORDER BY time" if "time" in columns else ""
     sql = f"""
-        SELECT time, instrument, side, amt, px, orderKind, orderType, tif, orderStatus, amt_usd
+        SELECT {'DISTINCT ' if distinct else ''}{', '.join(columns)}
         FROM {DEALS_TABLE}
         WHERE time BETWEEN %s AND %s
-        ORDER BY time
+        {order_by}
     """
 
-    # Execute query
-    df = _run_query(sql, (ts_start_str, ts_end_str))
+    # Execute query; time and the numeric columns land typed at load, so
+    # callbacks compare/weight against float64 directly (NULL becomes NaN/NaT)
+    df = _run_query(sql, (dt_start, dt_end), dtype=DEAL_DTYPES)
 
     # Convert time to datetime if data exists
     if not df.empty and 'time' in df.columns:
         df['time'] = pd.to_datetime(df['time'], utc=True)
 
+    # Low-cardinality symbol columns become categoricals: isin()/== filters then
+    # compare small integer codes instead of Python strings
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
     return df
 
 
-def _fetch_slices(start_datetime: str, end_datetime: str, view: str = 'return') -> pd.DataFrame:
+def _fetch_slices(start_datetime: str, end_datetime: str, view: str = 'return',
+                  instruments: Optional[Sequence[str]] = None) -> pd.DataFrame:
     """
-    Fetch slices for a given datetime range.
-    
-    OPTIMIZED: Only fetches columns needed for the view (56% less data!)
-    - Before: 9 columns (time, instrument, t_from_deal, ask_px_0, bid_px_0, usd_ask_px_0, usd_bid_px_0, ret, pnl_usd)
-    - After: 4 columns (time, instrument, t_from_deal, ret OR pnl_usd)
-    """
-    # Parse datetime strings - support both date and datetime formats
-    def parse_datetime(dt_str: str) -> datetime:
-        dt_str = dt_str.strip()
-        # Try datetime format first
-        for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']:
-            try:
-                dt = datetime.strptime(dt_str, fmt)
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                return dt
-            except ValueError:
-                continue
-        raise ValueError(f"Cannot parse datetime: {dt_str}")
-    
-    dt_start = parse_datetime(start_datetime)
-    dt_end = parse_datetime(end_datetime)
+    Fetch slices for a given datetime range, optionally only for `instruments`.
 
-    # Format timestamps for QuestDB (YYYY-MM-DDTHH:MM:SS.ffffffZ)
-    fmt = '%Y-%m-%dT%H:%M:%S.%fZ'
-    ts_start_str = dt_start.strftime(fmt)
-    ts_end_str = dt_end.strftime(fmt)
+    Only the value column of the view (ret or pnl_usd) is fetched next to
+    time, instrument and t_from_deal.
+    """
+    # /exp takes no bind parameters: the bounds are re-formatted from parsed
+    # datetimes and instrument names are quoted, so nothing is inlined raw
+    ts_start_str = _fmt_questdb_ts(start_datetime)
+    ts_end_str = _fmt_questdb_ts(end_datetime)
 
-    # OPTIMIZATION: Only fetch columns we actually use!
     # Select value column based on view
     value_col = 'ret' if view == 'return' else 'pnl_usd'
     
-    # Build SQL query - fetch ONLY needed columns (56% less data!)
+    # Build WHERE clause (instrument predicate pushed down when filtering)
+    where_clauses = [f"time BETWEEN '{ts_start_str}' AND '{ts_end_str}'"]
+    if instruments:
+        inst_list = ','.join(_sql_str(inst) for inst in instruments)
+        where_clauses.append(f"instrument IN ({inst_list})")
+
+    # time comes as epoch microseconds: an integer column, no string parsing
     sql = f"""
-        SELECT time, instrument, t_from_deal, {value_col}
+        SELECT CAST(time AS LONG) AS time, instrument, t_from_deal, {value_col}
         FROM {SLICES_TABLE}
-        WHERE time BETWEEN %s AND %s
-        ORDER BY time, t_from_deal
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY time, instrument, t_from_deal
     """
 
-    print(f"[DEBUG] Fetching slices with columns: time, instrument, t_from_deal, {value_col}")
-    
-    # Execute query
-    df = _run_query(sql, (ts_start_str, ts_end_str))
+    log.debug("Fetching slices with columns: time, instrument, t_from_deal, %s", value_col)
 
-    # Convert time to datetime if data exists
-    if not df.empty and 'time' in df.columns:
-        df['time'] = pd.to_datetime(df['time'], utc=True)
+    # Slices are the bulk payload (hundreds of thousands of rows): stream them
+    # as CSV and let the Arrow CSV reader produce typed columns directly,
+    # instead of one Python object per value over the PG text protocol
+    df = _run_export(sql, dtype={
+        'time': np.int64,
+        'instrument': 'category',
+        't_from_deal': np.int16,  # whole-second offsets within +/- the frame
+        value_col: np.float32,
+    })
+
+    if not df.empty:
+        df['time'] = pd.to_datetime(df['time'].to_numpy().astype('datetime64[us]'), utc=True)
 
     return df
 
@@ -196,52 +193,25 @@ def _fetch_aggregated_slices(start_datetime: str, end_datetime: str,
         filters: Dict with keys: instruments, sides, order_kinds, order_types, tifs
     
     Returns:
-        DataFrame with columns: group_key, t_from_deal, weighted_avg, deal_count, total_amt_usd
+        DataFrame with columns: group_key, t_from_deal, weighted_avg
     """
-    # Parse datetime strings
-    def parse_datetime(dt_str: str):
-        dt_str = dt_str.strip()
-        for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']:
-            try:
-                dt = datetime.strptime(dt_str, fmt)
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                return dt
-            except ValueError:
-                continue
-        raise ValueError(f"Cannot parse datetime: {dt_str}")
-    
-    dt_start = parse_datetime(start_datetime)
-    dt_end = parse_datetime(end_datetime)
-    
-    # Format timestamps for QuestDB
-    fmt = '%Y-%m-%dT%H:%M:%S.%fZ'
-    ts_start_str = dt_start.strftime(fmt)
-    ts_end_str = dt_end.strftime(fmt)
-    
     # Select the value column based on view
     value_col = 'ret' if view == 'return' else 'pnl_usd'
     
-    # Build WHERE clause
-    where_clauses = [
-        f"s.time BETWEEN '{ts_start_str}' AND '{ts_end_str}'"
-    ]
-    
-    if filters.get('instruments'):
-        inst_list = "','".join(filters['instruments'])
-        where_clauses.append(f"d.instrument IN ('{inst_list}')")
-    if filters.get('sides'):
-        side_list = "','".join(filters['sides'])
-        where_clauses.append(f"d.side IN ('{side_list}')")
-    if filters.get('order_kinds'):
-        ok_list = "','".join(filters['order_kinds'])
-        where_clauses.append(f"d.orderKind IN ('{ok_list}')")
-    if filters.get('order_types'):
-        ot_list = "','".join(filters['order_types'])
-        where_clauses.append(f"d.orderType IN ('{ot_list}')")
-    if filters.get('tifs'):
-        tif_list = "','".join(filters['tifs'])
-        where_clauses.append(f"d.tif IN ('{tif_list}')")
+    # Build WHERE clause with bind parameters only: the SQL text then depends
+    # on the number of selected values, not on the values or dates themselves,
+    # and nothing user-supplied is spliced into it
+    where_clauses = ["s.time BETWEEN %s AND %s"]
+    params = [_parse_dt(start_datetime), _parse_dt(end_datetime)]
+    
+    for key, column in (('instruments', 'd.instrument'), ('sides', 'd.side'),
+                        ('order_kinds', 'd.orderKind'), ('order_types', 'd.orderType'),
+                        ('tifs', 'd.tif')):
+        values = filters.get(key)
+        if values:
+            placeholders = ','.join(['%s'] * len(values))
+            where_clauses.append(f"{column} IN ({placeholders})")
+            params.extend(values)
     
     where_clause = " AND ".join(where_clauses)
     
@@ -265,13 +235,13 @@ def _fetch_aggregated_slices(start_datetime: str, end_datetime: str,
     # Build SQL query with weighted average
     # Formula: weighted_avg = SUM(value * weight) / SUM(weight)
     # where weight = amt_usd
+    # Only what the plot reads is selected: a per-group deal count would cost a
+    # COUNT(DISTINCT time || instrument) string hash over every joined slice row
     sql = f"""
         SELECT 
             {select_group},
             s.t_from_deal,
-            SUM(s.{value_col} * d.amt_usd) / SUM(d.amt_usd) AS weighted_avg,
-            COUNT(DISTINCT d.time || d.instrument) AS deal_count,
-            SUM(d.amt_usd) AS total_amt_usd
+            SUM(s.{value_col} * d.amt_usd) / SUM(d.amt_usd) AS weighted_avg
         FROM {SLICES_TABLE} s
         JOIN {DEALS_TABLE} d ON s.time = d.time AND s.instrument = d.instrument
         WHERE {where_clause}
@@ -279,19 +249,21 @@ def _fetch_aggregated_slices(start_datetime: str, end_datetime: str,
         ORDER BY group_key, s.t_from_deal
     """
     
-    print(f"[DEBUG] Executing aggregated query for group_by={group_by}")
-    import time
+    log.debug("Executing aggregated query for group_by=%s", group_by)
     start_time = time.time()
     
-    df = _run_query(sql)
+    # Narrow the plotted columns: second offsets fit int32 and float32 is ample
+    # for displayed returns/PnL - halves the arrays handed to Plotly
+    df = _run_query(sql, params, dtype={'t_from_deal': np.int32, 'weighted_avg': np.float32})
     
     elapsed = time.time() - start_time
-    print(f"[DEBUG] Fetched {len(df)} aggregated rows in {elapsed:.2f}s (vs millions of raw slices!)")
+    log.debug("Fetched %d aggregated rows in %.2fs", len(df), elapsed)
     
     return df
 
 
-def _build_dataset(start_datetime: str, end_datetime: str, view: str) -> tuple[pd.DataFrame, dict]:
+def _build_dataset(start_datetime: str, end_datetime: str, view: str,
+                   filters: Optional[dict] = None) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Build dataset from precomputed tables.
     
@@ -299,59 +271,116 @@ def _build_dataset(start_datetime: str, end_datetime: str, view: str) -> tuple[p
         start_datetime: Start datetime string in 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' format
         end_datetime: End datetime string in 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' format
         view: View type ('return' or 'usd_pnl')
+        filters: Optional dict with keys instruments, sides, order_kinds, order_types,
+            tifs (as for _filter_deals). Slices are then only fetched for matching
+            deals, and not at all when nothing matches.
     
     Returns:
-        Tuple of (deals_df, slices_dict) where slices_dict maps deal index to slice DataFrame
+        Tuple of (deals_df, slices_df) where deals_df holds all deals in the range
+        and slices_df is one tall frame with columns deal_id (deals_df index),
+        instrument, t_from_deal (int16 seconds) and value (float32; 'ret' or
+        'pnl_usd' depending on view). Each deal's rows are contiguous and sorted
+        by t_from_deal.
     """
-    # Fetch all deals for the datetime range
-    deals_df = _fetch_deals(start_datetime, end_datetime)
+    start_time = time.time()
+    if filters and any(filters.values()):
+        # Filtered: the deals decide which slices are needed, so fetch them first,
+        # skip the slices query entirely if nothing matches, and otherwise push
+        # the selected instruments down into the slices WHERE clause
+        deals_df = _fetch_deals(start_datetime, end_datetime, PLOT_DEAL_COLUMNS)
+        if deals_df.empty:
+            log.debug("No deals found for %s to %s", start_datetime, end_datetime)
+            return pd.DataFrame(), pd.DataFrame(columns=SLICE_FRAME_COLUMNS)
+
+        selected = _filter_deals(deals_df, **filters)
+        if selected.empty:
+            log.debug("No deals match filters for %s to %s", start_datetime, end_datetime)
+            return deals_df, pd.DataFrame(columns=SLICE_FRAME_COLUMNS)
+
+        log.debug("Found %d deals (%d matching) for %s to %s",
+                  len(deals_df), len(selected), start_datetime, end_datetime)
+        slices_df = _fetch_slices(start_datetime, end_datetime, view=view,
+                                  instruments=selected['instrument'].unique().tolist())
+    else:
+        # Unfiltered: fetch deals and slices concurrently, wall time is
+        # max(deals, slices) instead of their sum
+        f_deals = _EXECUTOR.submit(_fetch_deals, start_datetime, end_datetime, PLOT_DEAL_COLUMNS)
+        f_slices = _EXECUTOR.submit(_fetch_slices, start_datetime, end_datetime, view=view)
+        deals_df = f_deals.result()
 
-    if deals_df.empty:
-        print(f"No deals found for {start_datetime} to {end_datetime}")
-        return pd.DataFrame(), {}
+        if deals_df.empty:
+            f_slices.cancel()
+            log.debug("No deals found for %s to %s", start_datetime, end_datetime)
+            return pd.DataFrame(), pd.DataFrame(columns=SLICE_FRAME_COLUMNS)
 
-    print(f"Found {len(deals_df)} deals for {start_datetime} to {end_datetime}")
+        log.debug("Found %d deals for %s to %s", len(deals_df), start_datetime, end_datetime)
+        selected = deals_df
+        slices_df = f_slices.result()
 
-    # Fetch all slices for the datetime range (OPTIMIZED: only fetch needed columns!)
-    import time
-    start_time = time.time()
-    slices_df = _fetch_slices(start_datetime, end_datetime, view=view)
     fetch_time = time.time() - start_time
-    print(f"Fetched slices in {fetch_time:.2f}s")
+    log.debug("Fetched deals and slices in %.2fs", fetch_time)
 
     if slices_df.empty:
-        print(f"No slices found for {start_datetime} to {end_datetime}")
-        return deals_df, {}
+        log.debug("No slices found for %s to %s", start_datetime, end_datetime)
+        return deals_df, pd.DataFrame(columns=SLICE_FRAME_COLUMNS)
 
-    print(f"Found {len(slices_df)} slices for {start_datetime} to {end_datetime}")
+    log.debug("Found %d slices for %s to %s", len(slices_df), start_datetime, end_datetime)
 
-    # Build slices_dict: map each deal index to its corresponding slices
+    # Build the tall slices frame: link each deal to its corresponding slices
     # OPTIMIZED: Use pandas merge and groupby to avoid iterrows()
     start_time = time.time()
     
-    # Create a temporary column with the original index for tracking
-    deals_df['_original_idx'] = deals_df.index
+    # Deals sharing a (time, instrument) key have the same slices, so join and
+    # slice per distinct key and fan the result out to the deals afterwards.
+    # Both sides share one instrument CategoricalDtype so the merge hashes the
+    # integer codes rather than falling back to object strings
+    inst_dtype = pd.CategoricalDtype(
+        selected['instrument'].cat.categories.union(slices_df['instrument'].cat.categories)
+    )
+    deal_keys = selected[['time', 'instrument']].astype({'instrument': inst_dtype})
+    deal_key_ids = deal_keys.groupby(['time', 'instrument'], sort=False, observed=True).ngroup().to_numpy()
+    unique_keys = deal_keys.assign(_key=deal_key_ids).drop_duplicates('_key')
+    slices_df['instrument'] = slices_df['instrument'].astype(inst_dtype)
     
-    # Merge slices with deals on (time, instrument) to link each slice to its deal
+    # Merge slices with the distinct keys to link each slice to its key
+    # (validate='m:1' holds by construction: keys are unique)
     merged = slices_df.merge(
-        deals_df[['time', 'instrument', '_original_idx']],
+        unique_keys,
         on=['time', 'instrument'],
-        how='inner'
+        how='inner',
+        sort=False,
+        validate='m:1'
     )
+    del deal_keys, unique_keys
     
-    # Group by original index and create dictionary
-    # Sort each group by t_from_deal for proper ordering
-    slices_dict = {}
-    for deal_idx, group in merged.groupby('_original_idx'):
-        # Sort by t_from_deal and select only the columns we fetched
-        # (we now fetch fewer columns based on view - only what's needed!)
-        sorted_group = group.sort_values('t_from_deal')[
-            [col for col in group.columns if col != '_original_idx']
-        ].reset_index(drop=True)
-        slices_dict[deal_idx] = sorted_group
-    
-    # Clean up temporary column
-    deals_df.drop(columns=['_original_idx'], inplace=True)
+    # The slices come back ORDER BY time, instrument, t_from_deal and the inner
+    # merge keeps the left (slices) order, so every key's slices already form
+    # one ordered, contiguous run: no sort needed
+    value_col = 'ret' if view == 'return' else 'pnl_usd'
+    key_ids = merged['_key'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, key_ids[1:] != key_ids[:-1]]) if len(key_ids) else np.empty(0, dtype=np.intp)
+    run_start = np.full(deal_key_ids.max() + 1, -1, dtype=np.intp)
+    run_len = np.zeros(len(run_start), dtype=np.intp)
+    run_start[key_ids[starts]] = starts
+    run_len[key_ids[starts]] = np.diff(np.r_[starts, len(key_ids)])
+    
+    # Fan the key runs out to the deals as one tall, column-major frame (one
+    # array per column instead of a container entry per deal): deals sharing
+    # a key repeat its rows, row k of deal d is merged row run_start[key] + k
+    has_slices = run_start[deal_key_ids] >= 0
+    deal_keys_hit = deal_key_ids[has_slices]
+    lens = run_len[deal_keys_hit]
+    offsets = np.cumsum(lens) - lens
+    rows = np.arange(lens.sum()) - np.repeat(offsets, lens) + np.repeat(run_start[deal_keys_hit], lens)
+    slices_out = pd.DataFrame({
+        'deal_id': np.repeat(selected.index.to_numpy()[has_slices], lens),
+        'instrument': pd.Categorical.from_codes(
+            np.repeat(selected['instrument'].cat.codes.to_numpy()[has_slices], lens),
+            dtype=selected['instrument'].dtype,
+        ),
+        't_from_deal': merged['t_from_deal'].to_numpy(dtype=np.int16)[rows],
+        'value': merged[value_col].to_numpy(dtype=np.float32)[rows],
+    })
     
     # CRITICAL: Delete merged DataFrame and force garbage collection
     # This is essential for handling 5+ days of data on remote servers
@@ -359,10 +388,71 @@ def _build_dataset(start_datetime: str, end_datetime: str, view: str) -> tuple[p
     gc.collect()
     
     build_time = time.time() - start_time
-    print(f"Built {len(slices_dict)} slice groups for {len(deals_df)} deals in {build_time:.2f}s")
+    log.debug("Built %d slice rows for %d of %d deals in %.2fs",
+              len(slices_out), int(has_slices.sum()), len(selected), build_time)
+
+    return deals_df, slices_out
+
+
+
+def _filter_deals(deals_df: pd.DataFrame, instruments=None, sides=None,
+                  order_kinds=None, order_types=None, tifs=None) -> pd.DataFrame:
+    """Apply the dropdown selections to deals_df; empty selections mean 'All'."""
+    active = [(col, values) for col, values in (('instrument', instruments), ('side', sides),
+                                                ('orderKind', order_kinds), ('orderType', order_types),
+                                                ('tif', tifs)) if values]
+    if not active:
+        # Nothing selected: no mask, no row copy
+        return deals_df
+
+    # AND the isin() results into one numpy buffer in place instead of
+    # allocating (and index-aligning) a new boolean Series per filter
+    mask = np.ones(len(deals_df), dtype=bool)
+    for col, values in active:
+        np.logical_and(mask, deals_df[col].isin(values).to_numpy(), out=mask)
+    return deals_df[mask]
 
-    return deals_df, slices_dict
 
+def _filter_options(deals_df: pd.DataFrame) -> dict:
+    """
+    Build dropdown options from deals_df.
+
+    The symbol columns are categoricals (see _fetch_deals), whose categories
+    are already the sorted distinct non-null values, so no column scan or
+    sort is needed here.
+    """
+    def options(col):
+        values = deals_df[col].cat.categories if isinstance(deals_df[col].dtype, pd.CategoricalDtype) \
+            else sorted(deals_df[col].dropna().unique())
+        return [{'label': v, 'value': v} for v in values]
+
+    return {
+        'instruments': options('instrument'),
+        'sides': options('side'),
+        'order_kinds': options('orderKind'),
+        'order_types': options('orderType'),
+        'tifs': options('tif')
+    }
+
+
+@lru_cache(maxsize=32)
+def _filter_options_cached(start_datetime: str, end_datetime: str, bucket: int) -> dict:
+    """Filter options for a datetime range, memoized per time bucket."""
+    # Only the distinct filter combinations come back (a few hundred rows
+    # at most), not one row per deal
+    deals_df = _fetch_deals(start_datetime, end_datetime, columns=FILTER_COLUMNS, distinct=True)
+
+    if deals_df.empty:
+        return {
+            'instruments': [],
+            'sides': [],
+            'order_kinds': [],
+            'order_types': [],
+            'tifs': []
+        }
+
+    # Generate filter options
+    return _filter_options(deals_df)
 
 
 def get_filter_options(start_datetime: str, end_datetime: str) -> dict:
@@ -373,28 +463,10 @@ def get_filter_options(start_datetime: str, end_datetime: str) -> dict:
     Each value is a list of {'label': x, 'value': x} dicts for dropdown options.
     """
     try:
-        # Fetch deals to get distinct values
-        deals_df = _fetch_deals(start_datetime, end_datetime)
-        
-        if deals_df.empty:
-            return {
-                'instruments': [],
-                'sides': [],
-                'order_kinds': [],
-                'order_types': [],
-                'tifs': []
-            }
-        
-        # Generate filter options
-        return {
-            'instruments': [{'label': inst, 'value': inst} for inst in sorted(deals_df['instrument'].unique())],
-            'sides': [{'label': side, 'value': side} for side in sorted(deals_df['side'].unique())],
-            'order_kinds': [{'label': ok, 'value': ok} for ok in sorted(deals_df['orderKind'].dropna().unique())],
-            'order_types': [{'label': ot, 'value': ot} for ot in sorted(deals_df['orderType'].dropna().unique())],
-            'tifs': [{'label': tif, 'value': tif} for tif in sorted(deals_df['tif'].dropna().unique())]
-        }
-    except Exception as e:
-        print(f"[ERROR] Failed to fetch filter options: {e}")
+        # Repeated renders within CACHE_TTL_SECONDS reuse the last result
+        return _filter_options_cached(start_datetime, end_datetime, _ttl_bucket(CACHE_TTL_SECONDS))
+    except Exception:
+        log.exception("Failed to fetch filter options")
         return {
             'instruments': [],
             'sides': [],
@@ -404,6 +476,45 @@ def get_filter_options(start_datetime: str, end_datetime: str) -> dict:
         }
 
 
+# ---------------------------------------------------------------------------
+# Static layout parts
+# ---------------------------------------------------------------------------
+# Built once at import: only the default dates and filter options change
+# between renders, the placeholder figure, fixed options and styles do not
+_EMPTY_FIGURE = go.Figure()
+_EMPTY_FIGURE.update_layout(
+    margin=dict(l=40, r=20, t=60, b=40),
+    template="plotly_white",
+    xaxis_title="Time around Deal (s)",
+    yaxis_title="Value",
+    annotations=[
+        dict(
+            text="Select data to see decay plots",
+            xref="paper",
+            yref="paper",
+            x=0.5,
+            y=0.5,
+            showarrow=False,
+            font=dict(size=14, color="#7f8c8d"),
+        )
+    ],
+)
+
+_VIEW_OPTIONS = [
+    {'label': 'Return', 'value': 'return'},
+    {'label': 'PnL, $', 'value': 'usd_pnl'},
+]
+_AGGREGATE_OPTIONS = [
+    {'label': 'None (show all)', 'value': 'none'},
+    {'label': 'Instrument', 'value': 'instrument'},
+    {'label': 'Side', 'value': 'side'},
+    {'label': 'Day', 'value': 'day'},
+    {'label': 'Hour', 'value': 'hour'},
+]
+_LABEL_STYLE = {'fontWeight': '600', 'marginBottom': '4px', 'display': 'block', 'color': '#7f8c8d', 'fontSize': '13px'}
+_DROPDOWN_STYLE = {'marginBottom': '12px', 'fontSize': '14px', 'color': '#2c3e50'}
+
+
 def get_widget_layout(n_intervals):
     """
     Decay/Markouts widget with filtering and plotting.
@@ -414,33 +525,11 @@ def get_widget_layout(n_intervals):
     Returns:
         Dash HTML layout with graph and filters
     """
-    # Create initial empty figure
-    fig = go.Figure()
-    fig.update_layout(
-        margin=dict(l=40, r=20, t=60, b=40),
-        template="plotly_white",
-        xaxis_title="Time around Deal (s)",
-        yaxis_title="Value",
-        annotations=[
-            dict(
-                text="Select data to see decay plots",
-                xref="paper",
-                yref="paper",
-                x=0.5,
-                y=0.5,
-                showarrow=False,
-                font=dict(size=14, color="#7f8c8d"),
-            )
-        ],
-    )
-
-    # Fetch available dates for default values
-    available_dates = _fetch_available_dates()
+    # Fetch the latest available date for default values (cached for CACHE_TTL_SECONDS)
+    max_date_str = _latest_date_cached(_ttl_bucket(CACHE_TTL_SECONDS))
     
     # Determine default date range
-    if available_dates:
-        # Use most recent date as default
-        max_date_str = max(available_dates)
+    if max_date_str:
         # Default to last day of available data, full day range
         default_start = f"{max_date_str} 00:00:00"
         default_end = f"{max_date_str} 23:59:59"
@@ -498,96 +587,87 @@ def get_widget_layout(n_intervals):
         # Filters section (no longer collapsible)
         # View type dropdown
         html.Div([
-            html.Label("View:", style={'fontWeight': '600', 'marginBottom': '4px', 'display': 'block', 'color': '#7f8c8d', 'fontSize': '13px'}),
+            html.Label("View:", style=_LABEL_STYLE),
             dcc.Dropdown(
                 id='decay-view-dropdown',
-                options=[
-                    {'label': 'Return', 'value': 'return'},
-                    {'label': 'PnL, $', 'value': 'usd_pnl'},
-                ],
+                options=_VIEW_OPTIONS,
                 value='return',
                 clearable=False,
-                style={'marginBottom': '12px', 'fontSize': '14px', 'color': '#2c3e50'}
+                style=_DROPDOWN_STYLE
             ),
         ]),
 
         # Instrument filter
         html.Div([
-            html.Label("Instrument:", style={'fontWeight': '600', 'marginBottom': '4px', 'display': 'block', 'color': '#7f8c8d', 'fontSize': '13px'}),
+            html.Label("Instrument:", style=_LABEL_STYLE),
             dcc.Dropdown(
                 id='decay-instrument-filter',
                 options=initial_options['instruments'],
                 value=[],
                 multi=True,
                 placeholder='All',
-                style={'marginBottom': '12px', 'fontSize': '14px', 'color': '#2c3e50'}
+                style=_DROPDOWN_STYLE
             ),
         ]),
 
         # Side filter
         html.Div([
-            html.Label("Side:", style={'fontWeight': '600', 'marginBottom': '4px', 'display': 'block', 'color': '#7f8c8d', 'fontSize': '13px'}),
+            html.Label("Side:", style=_LABEL_STYLE),
             dcc.Dropdown(
                 id='decay-side-filter',
                 options=initial_options['sides'],
                 value=[],
                 multi=True,
                 placeholder='All',
-                style={'marginBottom': '12px', 'fontSize': '14px', 'color': '#2c3e50'}
+                style=_DROPDOWN_STYLE
             ),
         ]),
 
         # Order Kind filter
         html.Div([
-            html.Label("Order Kind:", style={'fontWeight': '600', 'marginBottom': '4px', 'display': 'block', 'color': '#7f8c8d', 'fontSize': '13px'}),
+            html.Label("Order Kind:", style=_LABEL_STYLE),
             dcc.Dropdown(
                 id='decay-orderkind-filter',
                 options=initial_options['order_kinds'],
                 value=[],
                 multi=True,
                 placeholder='All',
-                style={'marginBottom': '12px', 'fontSize': '14px', 'color': '#2c3e50'}
+                style=_DROPDOWN_STYLE
             ),
         ]),
 
         # Order Type filter
         html.Div([
-            html.Label("Order Type:", style={'fontWeight': '600', 'marginBottom': '4px', 'display': 'block', 'color': '#7f8c8d', 'fontSize': '13px'}),
+            html.Label("Order Type:", style=_LABEL_STYLE),
             dcc.Dropdown(
                 id='decay-ordertype-filter',
                 options=initial_options['order_types'],
                 value=[],
                 multi=True,
                 placeholder='All',
-                style={'marginBottom': '12px', 'fontSize': '14px', 'color': '#2c3e50'}
+                style=_DROPDOWN_STYLE
             ),
         ]),
 
         # TIF filter
         html.Div([
-            html.Label("Time In Force:", style={'fontWeight': '600', 'marginBottom': '4px', 'display': 'block', 'color': '#7f8c8d', 'fontSize': '13px'}),
+            html.Label("Time In Force:", style=_LABEL_STYLE),
             dcc.Dropdown(
                 id='decay-tif-filter',
                 options=initial_options['tifs'],
                 value=[],
                 multi=True,
                 placeholder='All',
-                style={'marginBottom': '12px', 'fontSize': '14px', 'color': '#2c3e50'}
+                style=_DROPDOWN_STYLE
             ),
         ]),
 
         # Aggregate dropdown
         html.Div([
-            html.Label("Group by:", style={'fontWeight': '600', 'marginBottom': '4px', 'display': 'block', 'color': '#7f8c8d', 'fontSize': '13px'}),
+            html.Label("Group by:", style=_LABEL_STYLE),
             dcc.Dropdown(
                 id='decay-aggregate-dropdown',
-                options=[
-                    {'label': 'None (show all)', 'value': 'none'},
-                    {'label': 'Instrument', 'value': 'instrument'},
-                    {'label': 'Side', 'value': 'side'},
-                    {'label': 'Day', 'value': 'day'},
-                    {'label': 'Hour', 'value': 'hour'},
-                ],
+                options=_AGGREGATE_OPTIONS,
                 value='none',
                 clearable=False,
                 style={'marginBottom': '16px', 'fontSize': '14px', 'color': '#2c3e50'}
@@ -628,12 +708,15 @@ def get_widget_layout(n_intervals):
 
     # Main layout
     return html.Div([
+        # Date range the filter dropdown options were last built for
+        dcc.Store(id='decay-filter-range', data=[default_start, default_end]),
+
         html.Div([
             # Left side - Graph
             html.Div(
                 dcc.Graph(
                     id='decay-graph',
-                    figure=fig,
+                    figure=_EMPTY_FIGURE,
                     config={'displaylogo': False},
                     style={'height': '85vh'}
                 ),
@@ -662,19 +745,3 @@ def get_widget_layout(n_intervals):
         'borderRadius': '12px',
         'boxShadow': '0 2px 8px rgba(0,0,0,0.08)'
     })
-
-
-if __name__ == "__main__":
-    # Test fetching data
-    deals_df, slices_dict = _build_dataset("2025-10-28", "2025-10-28", "return")
-    print(f"\nDeals: {len(deals_df)}")
-    print(f"Slices: {len(slices_dict)}")
-    
-    if deals_df is not None and not deals_df.empty:
-        print("\nFirst few deals:")
-        print(deals_df.head())
-    
-    if slices_dict:
-        first_idx = list(slices_dict.keys())[0]
-        print(f"\nFirst slice (deal idx={first_idx}):")
-        print(slices_dict[first_idx].head())
\ No newline at end of file
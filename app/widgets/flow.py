@@ -11,13 +11,22 @@ Supports filtration by instrument and datetime range.
 from dash import html, dcc
 import os
 from datetime import datetime, timezone
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import psycopg2
-from psycopg2.extras import RealDictCursor
+
+from ._db import (
+    fetch_latest_date as _fetch_latest_date,
+    fmt_questdb_ts as _fmt_questdb_ts,
+    parse_dt as _parse_dt,
+    run_export as _run_export,
+    run_query as _run_query,
+    sql_str as _sql_str,
+    ttl_bucket as _ttl_bucket,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -25,77 +34,39 @@ from psycopg2.extras import RealDictCursor
 # ---------------------------------------------------------------------------
 FLOW_MART_TABLE = "mart_pnl_flow"
 
+# Low-cardinality symbol columns of the flow mart
+CATEGORY_COLUMNS = ("instrument", "instrument_base", "instrument_quote")
+# Numeric metric columns of the flow mart
+METRIC_COLUMNS = ("upnl_usd", "upnl_base", "upnl_quote", "rpnl_usd_total", "tpnl_usd",
+                  "vol_usd", "cum_cost_usd", "num_deals")
+
 
 # ---------------------------------------------------------------------------
-# QuestDB connection helpers
+# QuestDB query helpers
 # ---------------------------------------------------------------------------
-QUESTDB_HOST = os.getenv("QUESTDB_HOST", "16.171.14.188")
-QUESTDB_PORT = int(os.getenv("QUESTDB_PG_PORT", "8812"))
-QUESTDB_USER = os.getenv("QUESTDB_USER", "admin")
-QUESTDB_PASSWORD = os.getenv("QUESTDB_PASSWORD", "quest")
-QUESTDB_DB = os.getenv("QUESTDB_DB", "qdb")
-VERBOSE = False
-
-
-def _connect():
-    """Create a new psycopg2 connection to QuestDB's Postgres endpoint."""
-    return psycopg2.connect(
-        host=QUESTDB_HOST,
-        port=QUESTDB_PORT,
-        user=QUESTDB_USER,
-        password=QUESTDB_PASSWORD,
-        database=QUESTDB_DB,
-        connect_timeout=30,
-    )
+# Query result caching: results are reused within one time bucket, so a
+# mart refresh shows up after at most CACHE_TTL_SECONDS
+CACHE_TTL_SECONDS = int(os.getenv("FLOW_CACHE_TTL_SECONDS", "300"))
+# Metric frames kept per bucket (each is minute buckets x instruments)
+METRICS_CACHE_SIZE = int(os.getenv("FLOW_METRICS_CACHE_SIZE", "16"))
 
 
-def _run_query(sql: str, params: tuple = ()) -> pd.DataFrame:
-    """Execute a SQL query against QuestDB and return a pandas DataFrame."""
-    with _connect() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(sql, params)
-        if VERBOSE:
-            print("[DEBUG SQL]", cur.query.decode())
-        rows = cur.fetchall()
-    return pd.DataFrame(rows)
+@lru_cache(maxsize=1)
+def _latest_date_cached(bucket: int) -> Optional[str]:
+    """Latest flow mart date memoized per time bucket."""
+    return _fetch_latest_date(FLOW_MART_TABLE, "ts")
 
 
-def _fetch_available_dates() -> List[str]:
-    """Fetch list of available dates from the flow mart table."""
-    sql = f"""
-        SELECT DISTINCT CAST(DATE_TRUNC('day', ts) AS DATE) as date
-        FROM {FLOW_MART_TABLE}
-        ORDER BY date DESC
-    """
-    df = _run_query(sql)
-    if df.empty:
-        return []
-    # Convert to datetime and extract date part to ensure YYYY-MM-DD format
-    dates = pd.to_datetime(df["date"]).dt.date
-    return [d.isoformat() for d in dates]
+def _includes_today(end_datetime: str) -> bool:
+    """True if a range ending at end_datetime reaches the current (UTC) day."""
+    return _parse_dt(end_datetime).date() >= datetime.now(timezone.utc).date()
 
 
 def _fetch_available_instruments(start_datetime: str, end_datetime: str) -> List[str]:
     """Fetch list of available instruments for the given date range."""
-    # Parse datetime strings
-    def parse_datetime(dt_str: str) -> datetime:
-        dt_str = dt_str.strip()
-        for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']:
-            try:
-                dt = datetime.strptime(dt_str, fmt)
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                return dt
-            except ValueError:
-                continue
-        raise ValueError(f"Cannot parse datetime: {dt_str}")
-
-    dt_start = parse_datetime(start_datetime)
-    dt_end = parse_datetime(end_datetime)
-
-    # Format timestamps for QuestDB
-    fmt = '%Y-%m-%dT%H:%M:%S.%fZ'
-    ts_start_str = dt_start.strftime(fmt)
-    ts_end_str = dt_end.strftime(fmt)
+    # Native datetimes are adapted by psycopg2 directly, no string round-trip
+    dt_start = _parse_dt(start_datetime)
+    dt_end = _parse_dt(end_datetime)
 
     sql = f"""
         SELECT DISTINCT instrument
@@ -103,7 +74,7 @@ def _fetch_available_instruments(start_datetime: str, end_datetime: str) -> List
         WHERE ts BETWEEN %s AND %s
         ORDER BY instrument
     """
-    df = _run_query(sql, (ts_start_str, ts_end_str))
+    df = _run_query(sql, (dt_start, dt_end))
     if df.empty:
         return []
     return df['instrument'].tolist()
@@ -128,44 +99,45 @@ def _fetch_flow_metrics(start_datetime: str, end_datetime: str, instruments: Lis
         - vol_usd: Volume in USD per bucket
         - cum_cost_usd: Cumulative cost in USD
         - num_deals: Number of deals in bucket
+
+    Historical ranges are cached per time bucket (the mart only changes for
+    the current day); ranges reaching today are always queried so the live
+    day keeps refreshing. The caller gets its own copy of a cached frame.
     """
-    # Parse datetime strings - support both date and datetime formats
-    def parse_datetime(dt_str: str) -> datetime:
-        dt_str = dt_str.strip()
-        # Try datetime format first
-        for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']:
-            try:
-                dt = datetime.strptime(dt_str, fmt)
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                return dt
-            except ValueError:
-                continue
-        raise ValueError(f"Cannot parse datetime: {dt_str}")
-
-    dt_start = parse_datetime(start_datetime)
-    dt_end = parse_datetime(end_datetime)
+    instruments = tuple(instruments) if instruments else ()
+    if _includes_today(end_datetime):
+        return _query_flow_metrics(start_datetime, end_datetime, instruments)
+    return _flow_metrics_cached(start_datetime, end_datetime, instruments,
+                                _ttl_bucket(CACHE_TTL_SECONDS)).copy()
+
 
+@lru_cache(maxsize=METRICS_CACHE_SIZE)
+def _flow_metrics_cached(start_datetime: str, end_datetime: str, instruments: tuple,
+                         bucket: int) -> pd.DataFrame:
+    """_query_flow_metrics memoized per time bucket; never modify the returned frame."""
+    return _query_flow_metrics(start_datetime, end_datetime, instruments)
+
+
+def _query_flow_metrics(start_datetime: str, end_datetime: str, instruments: tuple) -> pd.DataFrame:
+    """Run the flow metrics query for _fetch_flow_metrics."""
     # Format timestamps for QuestDB (YYYY-MM-DDTHH:MM:SS.ffffffZ)
-    fmt = '%Y-%m-%dT%H:%M:%S.%fZ'
-    ts_start_str = dt_start.strftime(fmt)
-    ts_end_str = dt_end.strftime(fmt)
+    ts_start_str = _fmt_questdb_ts(start_datetime)
+    ts_end_str = _fmt_questdb_ts(end_datetime)
 
-    # Build WHERE clause
-    where_clauses = [f"ts BETWEEN %s AND %s"]
-    params = [ts_start_str, ts_end_str]
+    # Build WHERE clause (/exp takes no bind parameters: the bounds are
+    # re-formatted from parsed datetimes and instrument names are quoted)
+    where_clauses = [f"ts BETWEEN '{ts_start_str}' AND '{ts_end_str}'"]
 
     if instruments:
-        placeholders = ','.join(['%s'] * len(instruments))
-        where_clauses.append(f"instrument IN ({placeholders})")
-        params.extend(instruments)
+        inst_list = ','.join(_sql_str(inst) for inst in instruments)
+        where_clauses.append(f"instrument IN ({inst_list})")
 
     where_clause = " AND ".join(where_clauses)
 
     # Query flow metrics
     sql = f"""
         SELECT
-            ts,
+            CAST(ts AS LONG) AS ts,
             instrument,
             instrument_base,
             instrument_quote,
@@ -182,15 +154,21 @@ def _fetch_flow_metrics(start_datetime: str, end_datetime: str, instruments: Lis
         ORDER BY ts, instrument
     """
 
-    # Execute query
-    df = _run_query(sql, tuple(params))
+    # Minute buckets x instruments is the widget's bulk payload: stream it as
+    # CSV through /exp and let the Arrow CSV reader build the typed columns
+    # (metrics as float64, NULLs as NaN; symbols straight to categoricals)
+    # instead of decoding one Python object per value over the PG wire protocol
+    df = _run_export(sql, dtype={
+        'ts': np.int64,
+        **{col: np.float64 for col in METRIC_COLUMNS},
+        **{col: 'category' for col in CATEGORY_COLUMNS},
+    })
 
     if df.empty:
         return pd.DataFrame()
 
-    # Convert ts to datetime
-    if 'ts' in df.columns:
-        df['ts'] = pd.to_datetime(df['ts'], utc=True)
+    # ts comes as epoch microseconds: reinterpreted as datetime64, not parsed
+    df['ts'] = pd.to_datetime(df['ts'].to_numpy().astype('datetime64[us]'), utc=True)
 
     return df
 
@@ -242,13 +220,12 @@ def get_widget_layout(n_intervals):
         ],
     )
 
-    # Fetch available dates for default values
-    available_dates = _fetch_available_dates()
+    # Fetch the latest available date for default values
+    # Cached for CACHE_TTL_SECONDS: dates change at most daily
+    max_date_str = _latest_date_cached(_ttl_bucket(CACHE_TTL_SECONDS))
 
     # Determine default date range
-    if available_dates:
-        # Use most recent date as default
-        max_date_str = max(available_dates)
+    if max_date_str:
         # Default to last 7 days of available data
         default_end = f"{max_date_str} 23:59:59"
         # Calculate start date (7 days before)
@@ -268,8 +245,10 @@ def get_widget_layout(n_intervals):
     try:
         initial_instruments = _fetch_available_instruments(default_start, default_end)
         initial_instrument_options = [{'label': inst, 'value': inst} for inst in initial_instruments]
+        initial_instrument_range = [default_start, default_end]
     except Exception:
         initial_instrument_options = []
+        initial_instrument_range = None
 
     # Right panel with filters
     right_panel = html.Div([
@@ -364,6 +343,8 @@ def get_widget_layout(n_intervals):
     return html.Div([
         # Store component to persist legend visibility state
         dcc.Store(id='flow-legend-state', data={}),
+        # Date range the instrument dropdown options were last built for
+        dcc.Store(id='flow-instrument-range', data=initial_instrument_range),
 
         html.Div([
             # Left side - Graph
@@ -406,17 +387,17 @@ if __name__ == "__main__":
     # Test fetching data
     print("Testing flow widget data fetching...")
 
-    # Test available dates
-    dates = _fetch_available_dates()
-    print(f"\nAvailable dates: {dates[:5] if dates else 'None'}")
+    # Test latest available date
+    latest = _fetch_latest_date(FLOW_MART_TABLE, "ts")
+    print(f"\nLatest date: {latest or 'None'}")
 
-    if dates:
+    if latest:
         # Test fetching instruments
-        test_start = f"{dates[0]} 00:00:00"
-        test_end = f"{dates[0]} 23:59:59"
+        test_start = f"{latest} 00:00:00"
+        test_end = f"{latest} 23:59:59"
 
         instruments = _fetch_available_instruments(test_start, test_end)
-        print(f"\nAvailable instruments for {dates[0]}: {instruments}")
+        print(f"\nAvailable instruments for {latest}: {instruments}")
 
         # Test fetching metrics (all instruments)
         metrics_df = _fetch_flow_metrics(test_start, test_end)
@@ -9,23 +9,19 @@ Displays latency histogram and statistics from precomputed datamarts:
 from __future__ import annotations
 
 import os
-from datetime import date, datetime, timedelta, timezone
-from typing import List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
+import plotly.express as px
 import plotly.graph_objects as go
-import psycopg2
 from dash import dcc, html
-from psycopg2.extras import RealDictCursor
 
-# ---------------------------------------------------------------------------
-# QuestDB connection helpers
-# ---------------------------------------------------------------------------
-QUESTDB_HOST = os.getenv("QUESTDB_HOST", "16.171.14.188")
-QUESTDB_PORT = int(os.getenv("QUESTDB_PG_PORT", "8812"))
-QUESTDB_USER = os.getenv("QUESTDB_USER", "admin")
-QUESTDB_PASSWORD = os.getenv("QUESTDB_PASSWORD", "quest")
-QUESTDB_DB = os.getenv("QUESTDB_DB", "qdb")
+from ._db import run_export as _run_export, run_query as _run_query, ttl_bucket as _ttl_bucket
+
 
 # Datamart tables
 LATENCY_HISTOGRAM_TABLE = "mart_kraken_latency"
@@ -34,27 +30,18 @@ LATENCY_STATS_TABLE = "mart_kraken_latency_stats"
 # Display constants
 BIN_SIZE_MS = 2.0
 MAX_LATENCY_MS = 200.0
-VERBOSE = False
-
-def _connect():
-    """Create a new psycopg2 connection to QuestDB's Postgres endpoint."""
-    return psycopg2.connect(
-        host=QUESTDB_HOST,
-        port=QUESTDB_PORT,
-        user=QUESTDB_USER,
-        password=QUESTDB_PASSWORD,
-        database=QUESTDB_DB,
-        connect_timeout=30,
-    )
 
+# Magma palette sampled to one colour per hour (24 hours)
+_MAGMA = px.colors.sequential.Magma
+_HOUR_COLORS = [_MAGMA[int(i * (len(_MAGMA) - 1) / 23)] for i in range(24)]
+
+# Runs a render's independent queries concurrently (psycopg2 releases the GIL
+# while waiting on the socket; each task borrows its own pooled connection)
+_EXECUTOR = ThreadPoolExecutor(max_workers=3, thread_name_prefix="latency-fetch")
 
-def _run_query(sql: str, params: Sequence = ()) -> pd.DataFrame:
-    """Execute a SQL query against QuestDB and return a pandas DataFrame."""
-    with _connect() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(sql, params)
-        if VERBOSE: print("[DEBUG SQL]", cur.query.decode()) 
-        rows = cur.fetchall()
-    return pd.DataFrame(rows)
+# Lifetime of the cached available dates (seconds): the marts gain a date at
+# most once per day
+CACHE_TTL_SECONDS = int(os.getenv("LATENCY_CACHE_TTL_SECONDS", "60"))
 
 
 # ---------------------------------------------------------------------------
@@ -73,18 +60,10 @@ def _fetch_available_dates() -> List[str]:
     return df["date"].tolist()
 
 
-def _fetch_latest_date() -> Optional[str]:
-    """Fetch the most recent available date from the histogram datamart."""
-    sql = f"""
-        SELECT date
-        FROM {LATENCY_HISTOGRAM_TABLE}
-        ORDER BY ts DESC
-        LIMIT 1
-    """
-    df = _run_query(sql)
-    if df.empty:
-        return None
-    return df["date"].iloc[0]
+@lru_cache(maxsize=1)
+def _available_dates_cached(bucket: int) -> tuple:
+    """_fetch_available_dates memoized per time bucket."""
+    return tuple(_fetch_available_dates())
 
 
 def _fetch_histogram_data(date_str: str) -> pd.DataFrame:
@@ -93,22 +72,30 @@ def _fetch_histogram_data(date_str: str) -> pd.DataFrame:
 
     Returns DataFrame with: hour, latency_bin_start_ms, bin_count, latency_ms (bin center)
     """
+    # /exp takes no bind parameters: only inline a well-formed YYYY-MM-DD
+    try:
+        date_str = datetime.strptime(date_str, "%Y-%m-%d").date().isoformat()
+    except (TypeError, ValueError):
+        return pd.DataFrame()
+
     sql = f"""
         SELECT hour, latency_bin_start_ms, bin_count
         FROM {LATENCY_HISTOGRAM_TABLE}
-        WHERE date = %s
+        WHERE date = '{date_str}'
         ORDER BY hour, latency_bin_start_ms
     """
-    df = _run_query(sql, (date_str,))
+    df = _run_export(sql, dtype={"latency_bin_start_ms": np.float32})
 
     if df.empty:
         return df
 
-    df["hour"] = pd.to_numeric(df["hour"], errors="coerce").astype(int)
-    df["latency_bin_start_ms"] = pd.to_numeric(df["latency_bin_start_ms"], errors="coerce")
-    df["bin_count"] = pd.to_numeric(df["bin_count"], errors="coerce").fillna(0).astype(int)
+    # Narrow dtypes: hour fits in int8, bin starts are 2ms multiples (float32 is exact)
+    # and per-bin counts fit in int32 - halves the frame handed to the histogram.
+    df["hour"] = pd.to_numeric(df["hour"], errors="coerce").astype(np.int8)
+    df["latency_bin_start_ms"] = pd.to_numeric(df["latency_bin_start_ms"], errors="coerce").astype(np.float32)
+    df["bin_count"] = pd.to_numeric(df["bin_count"], errors="coerce").fillna(0).astype(np.int32)
     df.dropna(subset=["latency_bin_start_ms", "hour"], inplace=True)
-    df["latency_ms"] = df["latency_bin_start_ms"] + BIN_SIZE_MS / 2.0
+    df["latency_ms"] = df["latency_bin_start_ms"] + np.float32(BIN_SIZE_MS / 2.0)
     return df
 
 
@@ -126,7 +113,8 @@ def _fetch_stats(date_str: str) -> Optional[dict]:
     """
     df = _run_query(sql, (date_str,))
 
-    if df.empty:
+    # A day without usable samples still gets a stats row, with NULL values
+    if df.empty or df.iloc[0].isna().any():
         return None
 
     return {
@@ -140,23 +128,11 @@ def _fetch_stats(date_str: str) -> Optional[dict]:
 
 def _build_histogram(df: pd.DataFrame, stats: Optional[dict] = None) -> go.Figure:
     """Create histogram figure with separate traces for each hour using magma palette."""
-    import plotly.express as px
-
     fig = go.Figure()
+    hour_colors = _HOUR_COLORS
 
-    # Get magma colors from plotly (24 colors for 24 hours)
-    magma_colors = px.colors.sequential.Magma
-    # Expand to 24 colors by sampling
-    n_hours = 24
-    color_indices = [int(i * (len(magma_colors) - 1) / (n_hours - 1)) for i in range(n_hours)]
-    hour_colors = [magma_colors[i] for i in color_indices]
-
-    # Group by hour
-    hours = sorted(df["hour"].unique())
-
-    for hour in hours:
-        hour_df = df[df["hour"] == hour].copy()
-
+    # Partition by hour in a single pass (rows arrive ordered by hour from SQL)
+    for hour, hour_df in df.groupby("hour", sort=True):
         fig.add_trace(
             go.Bar(
                 x=hour_df["latency_ms"],
@@ -213,12 +189,7 @@ def _build_histogram(df: pd.DataFrame, stats: Optional[dict] = None) -> go.Figur
 
 def _date_range(start: date, end: date) -> List[date]:
     """Generate list of dates from start to end inclusive."""
-    dates = []
-    current = start
-    while current <= end:
-        dates.append(current)
-        current += timedelta(days=1)
-    return dates
+    return list(pd.date_range(start, end, freq='D').date)
 
 
 def _stat_table(stats: Optional[dict]) -> html.Div:
@@ -280,17 +251,26 @@ def create_filter_controls() -> html.Div:
 
 def get_available_dates() -> List[str]:
     """Return list of available dates in the datamart."""
-    return _fetch_available_dates()
+    return list(_available_dates_cached(_ttl_bucket(CACHE_TTL_SECONDS)))
 
 
 def get_widget_content(date_str: Optional[str] = None) -> html.Div:
     """Return the latency histogram layout."""
-    # Fetch available dates for the picker
-    available_dates = _fetch_available_dates()
-
-    # If no date specified, use the latest available date
+    # The picker dates, histogram and stats hit independent tables: with a
+    # date given, all three queries run concurrently
+    f_dates = _EXECUTOR.submit(_available_dates_cached, _ttl_bucket(CACHE_TTL_SECONDS))
+    if date_str:
+        f_hist = _EXECUTOR.submit(_fetch_histogram_data, date_str)
+        f_stats = _EXECUTOR.submit(_fetch_stats, date_str)
+    available_dates = f_dates.result()
+
+    # If no date specified, use the latest available date (dates come newest
+    # first and each date's mart rows are stamped at its midnight)
     if not date_str:
-        date_str = _fetch_latest_date()
+        date_str = available_dates[0] if available_dates else None
+        if date_str:
+            f_hist = _EXECUTOR.submit(_fetch_histogram_data, date_str)
+            f_stats = _EXECUTOR.submit(_fetch_stats, date_str)
 
     # If still no date (empty datamart), show empty state
     if not date_str:
@@ -317,9 +297,9 @@ def get_widget_content(date_str: Optional[str] = None) -> html.Div:
         stats_component = _stat_table(None)
         default_date = datetime.now(timezone.utc).date().isoformat()
     else:
-        # Fetch data from precomputed tables
-        df = _fetch_histogram_data(date_str)
-        stats = _fetch_stats(date_str)
+        # Fetched from the precomputed tables by the tasks above
+        df = f_hist.result()
+        stats = f_stats.result()
 
         if df.empty:
             fig = go.Figure()
@@ -349,18 +329,17 @@ def get_widget_content(date_str: Optional[str] = None) -> html.Div:
 
         default_date = date_str
 
-    # Convert available dates to date objects for the picker
-    available_date_objects = []
-    for d in available_dates:
-        try:
-            available_date_objects.append(datetime.strptime(d, "%Y-%m-%d").date())
-        except ValueError:
-            pass
+    # Convert available dates to date objects for the picker in one vectorized
+    # parse; unparseable entries become NaT and are dropped
+    parsed_dates = pd.to_datetime(pd.Series(available_dates, dtype=object), format="%Y-%m-%d", errors="coerce")
+    available_date_objects = parsed_dates.dropna().dt.date.tolist()
+    available_date_set = set(available_date_objects)
 
     # Determine min/max dates from available dates
     if available_date_objects:
-        min_date = min(available_date_objects)
-        max_date = max(available_date_objects)
+        # Dates arrive newest first (ORDER BY date DESC), so the ends are the extremes
+        min_date = available_date_objects[-1]
+        max_date = available_date_objects[0]
     else:
         min_date = date(2020, 1, 1)
         max_date = datetime.now(timezone.utc).date()
@@ -379,7 +358,7 @@ def get_widget_content(date_str: Optional[str] = None) -> html.Div:
                         display_format="YYYY-MM-DD",
                         disabled_days=[
                             d for d in _date_range(min_date, max_date)
-                            if d not in available_date_objects
+                            if d not in available_date_set
                         ],
                     ),
                 ],
@@ -1,3 +1,4 @@
+import io
 import requests
 import os
 import pandas as pd
@@ -11,6 +12,17 @@ QUESTDB_PORT_HTTP = 9000
 QUESTDB_PORT_ILP = 9009  # ILP port
 QUESTDB_TABLE_INGRESS = "index_ingress"
 
+
+def _to_nanos(ts: pd.Series) -> np.ndarray:
+    """Convert a timestamp column to int64 epoch nanoseconds in one vectorized pass.
+
+    Integer columns are epoch milliseconds (parsers cast to Datetime("ms")),
+    anything else is parsed as datetimes.
+    """
+    if pd.api.types.is_integer_dtype(ts):
+        return ts.to_numpy(dtype=np.int64) * 1_000_000
+    return pd.DatetimeIndex(pd.to_datetime(ts)).as_unit('ns').asi8
+
 class AdapterQdb:
     def __init__(self, host):
         self.host = host
@@ -202,33 +214,25 @@ class AdapterQdb:
             conf = f'tcp::addr={self.host}:{self.ilp_port};'
             row_count = 0
             
+            # Resolve the designated timestamps once, not per row
+            at_ns = _to_nanos(df['time']) if 'time' in df.columns else None
+
+            # Split columns into symbols/fields once; rows are then plain tuples
+            # (itertuples) instead of one pd.Series per row (iterrows)
+            symbol_cols = {'instrument', 'side', 'orderKind', 'orderType', 'tif', 'orderStatus'}
+            cols = list(df.columns)
+            symbol_pos = [(j, c) for j, c in enumerate(cols) if c in symbol_cols]
+            field_pos = [(j, c) for j, c in enumerate(cols) if c not in symbol_cols and c != 'time']
+
             with Sender.from_conf(conf) as sender:
-                for _, row in df.iterrows():
-                    # Build columns and symbols dictionaries
-                    columns = {}
-                    symbols = {}
-                    
-                    # Identify symbol columns
-                    symbol_cols = ['instrument', 'side', 'orderKind', 'orderType', 'tif', 'orderStatus']
-                    for col in df.columns:
-                        val = row.get(col)
-                        if pd.notna(val):  # Only add non-null values
-                            if col in symbol_cols:
-                                symbols[col] = val
-                            elif col != 'time':  # time goes to 'at' parameter
-                                columns[col] = val
+                for i, row in enumerate(df.itertuples(index=False, name=None)):
+                    # Build columns and symbols dictionaries (only non-null values)
+                    symbols = {c: row[j] for j, c in symbol_pos if pd.notna(row[j])}
+                    columns = {c: row[j] for j, c in field_pos if pd.notna(row[j])}
                     
                     # Get timestamp
-                    if 'time' in df.columns:
-                        ts_val = row['time']
-                        # Handle both integer microseconds/milliseconds and datetime objects
-                        if pd.api.types.is_integer(ts_val) or isinstance(ts_val, np.integer):
-                            # Assume milliseconds for deals (based on DealsParser line 389 casting to Datetime("ms"))
-                            at = TimestampNanos(int(ts_val * 1_000_000))  # Convert ms to nanos
-                        else:
-                            # Already a datetime
-                            ts = pd.to_datetime(ts_val)
-                            at = TimestampNanos(ts.value)
+                    if at_ns is not None:
+                        at = TimestampNanos(int(at_ns[i]))
                     else:
                         at = TimestampNanos(int(datetime.now().timestamp() * 1_000_000_000))
                     
@@ -316,38 +320,35 @@ class AdapterQdb:
             total_rows = 0
             batch_rows = 0
 
+            # Resolve the designated timestamps once, not per row
+            at_ns = None
+            if timestamp_col and timestamp_col in df.columns:
+                at_ns = _to_nanos(df[timestamp_col])
+
+            # Column positions resolved once; rows are then plain tuples
+            # (itertuples) instead of one pd.Series per row (iterrows)
+            cols = list(df.columns)
+            inst_pos = cols.index('instrument') if 'instrument' in cols else None
+            field_pos = [(j, c) for j, c in enumerate(cols)
+                         if c != 'instrument' and c != timestamp_col]
+
             with Sender.from_conf(conf) as sender:
                 # Iterate in batches
                 for batch_start in range(0, len(df), batch_size):
                     batch_df = df.iloc[batch_start:batch_start + batch_size]
 
-                    for _, row in batch_df.iterrows():
+                    for i, row in enumerate(batch_df.itertuples(index=False, name=None), start=batch_start):
                         # Symbols (tag columns)
                         symbols = {}
-                        exclude_cols = set()
-                        if 'instrument' in df.columns:
-                            symbols['instrument'] = row.get('instrument', 'unknown')
-                            exclude_cols.add('instrument')
+                        if inst_pos is not None:
+                            symbols['instrument'] = row[inst_pos]
 
                         # Columns (fields)
-                        columns = {}
-                        for col in df.columns:
-                            if col not in exclude_cols and col != timestamp_col:
-                                val = row.get(col)
-                                if pd.notna(val):
-                                    columns[col] = val
+                        columns = {c: row[j] for j, c in field_pos if pd.notna(row[j])}
 
                         # Timestamp
-                        if timestamp_col and timestamp_col in df.columns:
-                            ts_val = row[timestamp_col]
-                            # Handle both integer timestamps and datetime objects
-                            if pd.api.types.is_integer(ts_val) or isinstance(ts_val, np.integer):
-                                # Integer in milliseconds (from parsers)
-                                at = TimestampNanos(int(ts_val * 1_000_000))  # Convert ms to nanos
-                            else:
-                                # Already a datetime
-                                ts = pd.to_datetime(ts_val)
-                                at = TimestampNanos(ts.value)
+                        if at_ns is not None:
+                            at = TimestampNanos(int(at_ns[i]))
                         else:
                             at = TimestampNanos(int(datetime.now().timestamp() * 1_000_000_000))
 
@@ -432,31 +433,32 @@ class AdapterQdb:
         # print(f"Executing query: {query}")  # Debug output
         
         try:
+            # Stream the result as CSV from /exp and parse it with the pyarrow
+            # CSV reader (multithreaded, straight into typed columns) instead
+            # of decoding an /exec JSON document into one Python object per
+            # value (TOB tables are wide). Columns stay NumPy-backed, so
+            # callers keep NaN semantics for missing values
             response = requests.get(
-                f"http://{self.host}:{self.http_port}/exec",
+                f"http://{self.host}:{self.http_port}/exp",
                 params={'query': query},
-                headers={'Accept': 'application/json'}
+                stream=True,
             )
             
             if response.status_code == 200:
-                data = response.json()
-                if 'dataset' in data and len(data['dataset']) > 0:
-                    # Extract column names from response
-                    column_names = [col['name'] for col in data.get('columns', [])]
-                    
-                    # Create DataFrame with proper column names
-                    if column_names:
-                        df = pd.DataFrame(data['dataset'], columns=column_names)
-                    else:
-                        df = pd.DataFrame(data['dataset'])
-                    
-                    # Convert timestamp columns to datetime
-                    if 'ts_server' in df.columns:
-                        df['ts_server'] = pd.to_datetime(df['ts_server'])
-                    elif 'ts' in df.columns:
-                        df['ts'] = pd.to_datetime(df['ts'])
-                    elif 'time' in df.columns:
-                        df['time'] = pd.to_datetime(df['time'])
+                response.raw.decode_content = True
+                # The pyarrow reader rejects an empty body outright, so peek
+                # at the stream first (buffering keeps it readable after)
+                stream = io.BufferedReader(response.raw)
+                if not stream.peek(1):
+                    print(f"No data found in '{table_name}'")
+                    return pd.DataFrame()
+                df = pd.read_csv(stream, engine='pyarrow')
+                if len(df) > 0:
+                    # Convert timestamp columns to datetime (fixed QuestDB format)
+                    for col in ('ts_server', 'ts', 'time'):
+                        if col in df.columns:
+                            df[col] = pd.to_datetime(df[col], format='%Y-%m-%dT%H:%M:%S.%fZ', utc=True)
+                            break
                     print(f"Fetched {len(df)} rows from '{table_name}'")
                     return df
                 else:
@@ -0,0 +1,55 @@
+"""
+Shared QuestDB access for the mart jobs.
+
+Jobs that fan dates out over a thread pool give each worker thread one
+psycopg2 connection, reused across the dates it processes.
+"""
+
+import os
+import threading
+
+import psycopg2
+
+# ---------------------------------------------------------------------------
+# QuestDB connection settings
+# ---------------------------------------------------------------------------
+QUESTDB_HOST = os.getenv("QUESTDB_HOST", "16.171.14.188")
+QUESTDB_PORT = int(os.getenv("QUESTDB_PG_PORT", "8812"))
+QUESTDB_USER = os.getenv("QUESTDB_USER", "admin")
+QUESTDB_PASSWORD = os.getenv("QUESTDB_PASSWORD", "quest")
+QUESTDB_DB = os.getenv("QUESTDB_DB", "qdb")
+
+
+def connect():
+    """Create a new psycopg2 connection to QuestDB's Postgres endpoint."""
+    return psycopg2.connect(
+        host=QUESTDB_HOST,
+        port=QUESTDB_PORT,
+        user=QUESTDB_USER,
+        password=QUESTDB_PASSWORD,
+        database=QUESTDB_DB,
+        connect_timeout=30,
+    )
+
+
+# One connection per worker thread, reused across the dates it processes
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+
+def thread_conn():
+    """Return this thread's QuestDB connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or conn.closed:
+        conn = _local.conn = connect()
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def close_connections():
+    """Close the connections opened by thread_conn."""
+    with _connections_lock:
+        while _connections:
+            _connections.pop().close()
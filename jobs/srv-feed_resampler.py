@@ -5,35 +5,18 @@ Resamples feed_kraken_tob_5 into mart_kraken_tob_1s with FILL(PREV).
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import pandas as pd
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
-# ---------------------------------------------------------------------------
-# QuestDB connection settings
-# ---------------------------------------------------------------------------
-QUESTDB_HOST = os.getenv("QUESTDB_HOST", "16.171.14.188")
-QUESTDB_PORT = int(os.getenv("QUESTDB_PG_PORT", "8812"))
-QUESTDB_USER = os.getenv("QUESTDB_USER", "admin")
-QUESTDB_PASSWORD = os.getenv("QUESTDB_PASSWORD", "quest")
-QUESTDB_DB = os.getenv("QUESTDB_DB", "qdb")
+from _db import close_connections as _close_connections, thread_conn as _thread_conn
 
 SOURCE_TABLE = "feed_kraken_tob_5"
 MART_TABLE = "feed_kraken_1s"
 RESAMPLE = "1s"
-
-
-def _connect():
-    return psycopg2.connect(
-        host=QUESTDB_HOST,
-        port=QUESTDB_PORT,
-        user=QUESTDB_USER,
-        password=QUESTDB_PASSWORD,
-        database=QUESTDB_DB,
-        connect_timeout=30,
-    )
+MAX_WORKERS = int(os.getenv("RESAMPLE_MAX_WORKERS", "4"))
 
 
 def _update(date_str: str):
@@ -52,16 +35,24 @@ def _update(date_str: str):
         SAMPLE BY {RESAMPLE} FILL(PREV) ALIGN TO CALENDAR
     """
 
-    with _connect() as conn, conn.cursor() as cur:
+    conn = _thread_conn()
+    with conn, conn.cursor() as cur:
         cur.execute(sql)
-        conn.commit()
 
     print(f"Done resampling {date_str}")
 
 
 if __name__ == "__main__":
-    for date_str in ["2025-10-20", "2025-10-21", "2025-10-22",
-                     "2025-10-23", "2025-10-24", "2025-10-25",
-                     "2025-10-26", "2025-10-27", "2025-10-28",
-                     "2025-10-29", "2025-10-30"]:
-        _update(date_str)
\ No newline at end of file
+    dates = ["2025-10-20", "2025-10-21", "2025-10-22",
+             "2025-10-23", "2025-10-24", "2025-10-25",
+             "2025-10-26", "2025-10-27", "2025-10-28",
+             "2025-10-29", "2025-10-30"]
+
+    # Each day is an independent INSERT ... SAMPLE BY executed by QuestDB;
+    # overlap them instead of waiting on each round-trip in turn.
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for _ in executor.map(_update, dates):
+                pass
+    finally:
+        _close_connections()
\ No newline at end of file
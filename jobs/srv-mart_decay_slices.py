@@ -1,14 +1,21 @@
 """
 Job to populate mart_kraken_decay_slices table.
 
-Uses precomputed feed_kraken_1s table. Processes deals one by one
-with efficient timestamp-bounded queries.
+Uses precomputed feed_kraken_1s table. Loads each traded instrument's 1s
+quotes inside the day's deal windows once, cuts every deal's +/- FRAME_MINS
+window out of them in memory and pushes the slices via ILP.
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
 
+import numpy as np
+import pandas as pd
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_batch
+from questdb.ingress import Sender, IngressError
 
 # ---------------------------------------------------------------------------
 # QuestDB connection settings
@@ -25,6 +32,18 @@ PRICES_TABLE = "feed_kraken_1s"
 CONVMAP_TABLE = "map_decomposition_usd"
 
 FRAME_MINS = 15
+FRAME_SECS = FRAME_MINS * 60
+FRAME_NS = FRAME_SECS * 1_000_000_000
+DEALS_PER_BATCH = 100
+# amt_usd UPDATEs sent to QuestDB per round-trip (and per commit)
+UPDATES_PER_BATCH = 100
+# Quote rows converted to Python tuples at a time while loading prices
+FETCH_CHUNK_ROWS = 10_000
+# Dates processed concurrently (bounded by what QuestDB serves in parallel)
+MAX_WORKERS = int(os.getenv("DECAY_SLICES_MAX_WORKERS", "4"))
+
+SLICE_COLUMNS = ["time", "instrument", "t_from_deal", "ask_px_0", "bid_px_0",
+                 "usd_ask_px_0", "usd_bid_px_0", "ret", "pnl_usd"]
 
 
 def _connect():
@@ -42,45 +61,205 @@ def _fetch_convmap(cur) -> dict:
     """Fetch USD conversion map: {instrument: (instrument_usd, inst_usd_is_inverted)}"""
     cur.execute(f"SELECT instrument, instrument_usd, inst_usd_is_inverted FROM {CONVMAP_TABLE}")
     rows = cur.fetchall()
-    return {row['instrument']: (row['instrument_usd'], row['inst_usd_is_inverted']) for row in rows}
+    return {instrument: (instrument_usd, is_inverted) for instrument, instrument_usd, is_inverted in rows}
+
+
+def _quote_columns(inverted: bool) -> str:
+    """
+    SELECT list for ask/bid quotes, inverted in QuestDB for inverted USD pairs.
+
+    Inverted: rate = 1 / price, so rate_ask = 1 / bid and rate_bid = 1 / ask.
+    """
+    if inverted:
+        return "1.0 / bid_px_0 AS ask_px_0, 1.0 / ask_px_0 AS bid_px_0"
+    return "ask_px_0, bid_px_0"
 
 
-def _fetch_price_at(cur, instrument: str, timestamp: str):
+def _fetch_price_at(cur, instrument: str, timestamp: datetime, inverted: bool = False):
     """Fetch the nearest price for an instrument at or before the given timestamp."""
     sql = f"""
-        SELECT ask_px_0, bid_px_0
+        SELECT {_quote_columns(inverted)}
         FROM {PRICES_TABLE}
-        WHERE instrument = '{instrument}'
-          AND ts <= '{timestamp}'
+        WHERE instrument = %s
+          AND ts <= %s
         ORDER BY ts DESC
         LIMIT 1
     """
-    cur.execute(sql)
+    cur.execute(sql, (instrument, timestamp))
     row = cur.fetchone()
     if row:
         return row[0], row[1]
     return None
 
 
-def _fetch_deals(cur, date_str: str) -> list:
+def _deal_windows(deal_ns: np.ndarray):
+    """
+    Merge the +/- FRAME_MINS windows of the given deals into disjoint intervals.
+
+    Returns (starts_ns, ends_ns) int64 arrays, sorted by time.
+    """
+    deal_ns = np.sort(deal_ns)
+    starts, ends = deal_ns - FRAME_NS, deal_ns + FRAME_NS
+    # Windows all have the same width, so a new interval begins wherever a
+    # window starts after the previous one ends
+    breaks = np.flatnonzero(starts[1:] > ends[:-1]) + 1
+    first = np.r_[0, breaks]
+    last = np.r_[breaks - 1, len(deal_ns) - 1]
+    return starts[first], ends[last]
+
+
+def _fetch_prices(cur, instruments, windows, inverted: bool = False) -> dict:
+    """
+    Fetch the 1s quotes of all instruments inside the given windows at once.
+
+    Returns {instrument: (ts_ns, ask_px_0, bid_px_0)} with ts_ns sorted, so deal
+    windows and rates at a deal can be cut out with a binary search instead of
+    a query per deal. A single IN (...) query scans the day's partitions once
+    rather than once per instrument, and `windows` (see _deal_windows) limits
+    it to the quotes that fall into a deal window instead of the whole day.
+    With `inverted` the quotes come back as USD rates of an inverted pair.
+
+    Rows are pulled FETCH_CHUNK_ROWS at a time into preallocated arrays (sized
+    for one instrument's 1s quotes over the windows and grown as needed), so at most one
+    chunk of Python row tuples is alive at once (QuestDB has no server-side
+    named cursors). Rows are ordered by instrument, so each instrument's
+    series is one contiguous run of the buffers.
+    """
+    instruments = list(instruments)
+    w_from, w_to = windows
+    if not instruments or not len(w_from):
+        return {}
+    codes = {instrument: i for i, instrument in enumerate(instruments)}
+    sql = f"""
+        SELECT instrument, CAST(ts AS LONG) AS ts_us, {_quote_columns(inverted)}
+        FROM {PRICES_TABLE}
+        WHERE instrument IN ({', '.join(['%s'] * len(instruments))})
+          AND ({' OR '.join(['ts BETWEEN %s AND %s'] * len(w_from))})
+        ORDER BY instrument, ts
+    """
+    # Bounds go out as native datetimes (psycopg2 adapts them as timestamps),
+    # converted from the int64 ns arrays in one vectorized pass
+    bounds = np.column_stack([w_from, w_to]).astype('datetime64[ns]').astype('datetime64[us]')
+    cur.execute(sql, (*instruments, *bounds.ravel().tolist()))
+
+    capacity = int(((w_to - w_from) // 1_000_000_000 + 1).sum())
+    inst = np.empty(capacity, dtype=np.int32)
+    ts_ns = np.empty(capacity, dtype=np.int64)
+    ask = np.empty(capacity, dtype=np.float64)
+    bid = np.empty(capacity, dtype=np.float64)
+    n = 0
+    while True:
+        rows = cur.fetchmany(FETCH_CHUNK_ROWS)
+        if not rows:
+            break
+        end = n + len(rows)
+        if end > len(ts_ns):
+            size = max(end, 2 * len(ts_ns))
+            inst, ts_ns, ask, bid = (np.resize(arr, size) for arr in (inst, ts_ns, ask, bid))
+        # Tuple rows transposed column-wise straight into the buffers
+        # ts comes as epoch microseconds: no datetime objects to build or parse
+        c_inst, c_ts, c_ask, c_bid = zip(*rows)
+        inst[n:end] = [codes[i] for i in c_inst]
+        ts_ns[n:end] = c_ts
+        ts_ns[n:end] *= 1000
+        ask[n:end] = c_ask
+        bid[n:end] = c_bid
+        n = end
+
+    # Split the buffers at instrument changes (views, no copies)
+    inst = inst[:n]
+    starts = np.flatnonzero(np.r_[True, inst[1:] != inst[:-1]]) if n else np.empty(0, dtype=np.intp)
+    ends = np.r_[starts[1:], n]
+    return {
+        instruments[inst[a]]: (ts_ns[a:b], ask[a:b], bid[a:b])
+        for a, b in zip(starts.tolist(), ends.tolist())
+    }
+
+
+def _usd_rates_at(series, deal_ns: np.ndarray):
+    """
+    Prefetched USD quote at or before each deal time, for all deals at once.
+
+    Returns (ask, bid, found) arrays aligned with deal_ns; found is False where
+    the deal's own window holds no quote before it. The series only covers the
+    merged deal windows, so an older quote may come from a disjoint window with
+    unfetched quotes in between.
+    """
+    ts_ns, ask, bid = series
+    pos = np.searchsorted(ts_ns, deal_ns, side='right') - 1
+    found = pos >= 0
+    found[found] = ts_ns[pos[found]] >= deal_ns[found] - FRAME_NS
+    ask0 = np.full(len(deal_ns), np.nan)
+    bid0 = np.full(len(deal_ns), np.nan)
+    ask0[found] = ask[pos[found]]
+    bid0[found] = bid[pos[found]]
+    return ask0, bid0, found
+
+
+def _second_grids(prices: dict) -> dict:
+    """
+    Dense 1s grids of the given quote series for a positional join.
+
+    Returns {key: (origin_ns, present, ask, bid)} where slot k holds the
+    quote at origin_ns + k seconds (present marks filled slots). Instruments
+    whose timestamps are not on whole seconds are left out and joined by
+    binary search instead.
+    """
+    grids = {}
+    for key, (ts_ns, ask, bid) in prices.items():
+        if (ts_ns % 1_000_000_000).any():
+            continue
+        origin = ts_ns[0]
+        slot = (ts_ns - origin) // 1_000_000_000
+        present = np.zeros(slot[-1] + 1, dtype=bool)
+        present[slot] = True
+        ask_grid = np.full(len(present), np.nan)
+        bid_grid = np.full(len(present), np.nan)
+        ask_grid[slot] = ask
+        bid_grid[slot] = bid
+        grids[key] = (origin, present, ask_grid, bid_grid)
+    return grids
+
+
+def _fetch_deals(cur, date_str: str) -> pd.DataFrame:
     """Fetch deals for a specific date with side, amt, px for return/pnl calculations."""
+    day = datetime.strptime(date_str, "%Y-%m-%d")
     sql = f"""
         SELECT time, instrument, side, amt, px
         FROM {DEALS_TABLE}
-        WHERE time BETWEEN '{date_str}T00:00:00.000000Z' AND '{date_str}T23:59:59.999999Z'
+        WHERE time BETWEEN %s AND %s
         ORDER BY time
     """
-    cur.execute(sql)
-    return cur.fetchall()
+    cur.execute(sql, (day, day + timedelta(days=1, microseconds=-1)))
+    rows = cur.fetchall()
+    return pd.DataFrame.from_records(rows, columns=[d[0] for d in cur.description])
 
 
-def _process_deal(cur, deal, convmap: dict):
-    """Process a single deal - insert slices directly with return and pnl_usd calculations."""
-    deal_time = deal['time']
-    instrument = deal['instrument']
-    deal_side = deal['side']
-    deal_amt = deal['amt']
-    deal_px = deal['px']
+def _instrument_slices(inst_deals: pd.DataFrame, instrument: str, convmap: dict, prices: dict,
+                       usd_prices: dict, grids: dict, cur):
+    """
+    Build the slices of all deals of one instrument from the prefetched quotes.
+
+    Every deal's +/- FRAME_MINS window is gathered into one long set of arrays
+    (deal_pos says which deal a row belongs to), so ret/pnl_usd are computed
+    in a single vectorized pass instead of per deal. `usd_prices` holds the
+    USD rate series keyed by (usd_instrument, is_inverted), already inverted
+    for inverted pairs, and `grids` their _second_grids. Returns a DataFrame
+    with SLICE_COLUMNS (or None if there is nothing to write) and the USD mid
+    at t=0 of every deal as a Series aligned with inst_deals (NaN if missing).
+    """
+    no_mids = pd.Series(np.nan, index=inst_deals.index)
+    series = prices.get(instrument)
+    if series is None:
+        return None, no_mids
+    ts_ns, ask, bid = series
+
+    deal_time = inst_deals['time'].to_numpy()
+    deal_ns = pd.DatetimeIndex(deal_time).as_unit('ns').asi8
+    deal_amt = inst_deals['amt'].to_numpy(dtype=np.float64)
+    deal_px = inst_deals['px'].to_numpy(dtype=np.float64)
+    is_buy = inst_deals['side'].to_numpy() == 'BUY'
+    deal_rows = np.arange(len(deal_ns))
 
     # Get USD conversion info
     usd_info = convmap.get(instrument)
@@ -98,213 +277,236 @@ def _process_deal(cur, deal, convmap: dict):
 
     if usd_info is None:
         # No USD conversion needed - usd prices equal native prices
-        # Precompute entry_usd for pnl calculation
-        entry_usd = deal_px * deal_amt
-        if deal_side == 'BUY':
-            sql = f"""
-                INSERT INTO {SLICES_TABLE} (time, instrument, t_from_deal, ask_px_0, bid_px_0, usd_ask_px_0, usd_bid_px_0, ret, pnl_usd)
-                SELECT
-                    CAST('{deal_time}' AS TIMESTAMP) time,
-                    CAST('{instrument}' AS SYMBOL) instrument,
-                    CAST(extract(epoch from p.ts) - extract(epoch from CAST('{deal_time}' AS TIMESTAMP)) AS INT) t_from_deal,
-                    p.ask_px_0 ask_px_0,
-                    p.bid_px_0 bid_px_0,
-                    p.ask_px_0 usd_ask_px_0,
-                    p.bid_px_0 usd_bid_px_0,
-                    (p.bid_px_0 - {deal_px}) / {deal_px} ret,
-                    p.bid_px_0 * {deal_amt} - {entry_usd} pnl_usd
-                FROM {PRICES_TABLE} p
-                WHERE p.instrument = '{instrument}'
-                  AND p.ts BETWEEN DATEADD('m', -{FRAME_MINS}, '{deal_time}')
-                             AND DATEADD('m', {FRAME_MINS}, '{deal_time}')
-            """
-        else:
-            sql = f"""
-                INSERT INTO {SLICES_TABLE} (time, instrument, t_from_deal, ask_px_0, bid_px_0, usd_ask_px_0, usd_bid_px_0, ret, pnl_usd)
-                SELECT
-                    CAST('{deal_time}' AS TIMESTAMP) time,
-                    CAST('{instrument}' AS SYMBOL) instrument,
-                    CAST(extract(epoch from p.ts) - extract(epoch from CAST('{deal_time}' AS TIMESTAMP)) AS INT) t_from_deal,
-                    p.ask_px_0 ask_px_0,
-                    p.bid_px_0 bid_px_0,
-                    p.ask_px_0 usd_ask_px_0,
-                    p.bid_px_0 usd_bid_px_0,
-                    ({deal_px} - p.ask_px_0) / {deal_px} ret,
-                    {entry_usd} - p.ask_px_0 * {deal_amt} pnl_usd
-                FROM {PRICES_TABLE} p
-                WHERE p.instrument = '{instrument}'
-                  AND p.ts BETWEEN DATEADD('m', -{FRAME_MINS}, '{deal_time}')
-                             AND DATEADD('m', {FRAME_MINS}, '{deal_time}')
-            """
+        rate_ask = np.ones(len(deal_ns))
     else:
         usd_instrument, is_inverted = usd_info
-        
-        # Fetch USD rate at deal time
-        usd_prices = _fetch_price_at(cur, usd_instrument, deal_time)
-        if not usd_prices:
-            # print(f"Warning: No USD price found for {usd_instrument} at {deal_time}")
-            return
-
-        u_ask_0, u_bid_0 = usd_prices
-
-        if is_inverted:
-            # Inverted: rate = 1 / price
-            # rate_ask = 1 / u_bid, rate_bid = 1 / u_ask
-            rate_ask = 1.0 / u_bid_0 if u_bid_0 else 0
-            rate_bid = 1.0 / u_ask_0 if u_ask_0 else 0
-        else:
-            rate_ask = u_ask_0
-            rate_bid = u_bid_0
-
-        # Calculate entry_usd (deal volume in USD)
-        # We use the ask rate for the entry valuation (conservative/standard approach?)
-        # Previous code used e.ask_px_0 / eu.bid_px_0 for inverted, which maps to rate_ask.
-        entry_usd = deal_px * deal_amt * rate_ask
-
-        if is_inverted:
-            if deal_side == 'BUY':
-                sql = f"""
-                    INSERT INTO {SLICES_TABLE} (time, instrument, t_from_deal, ask_px_0, bid_px_0, usd_ask_px_0, usd_bid_px_0, ret, pnl_usd)
-                    SELECT
-                        CAST('{deal_time}' AS TIMESTAMP) time,
-                        CAST('{instrument}' AS SYMBOL) instrument,
-                        CAST(extract(epoch from p.ts) - extract(epoch from CAST('{deal_time}' AS TIMESTAMP)) AS INT) t_from_deal,
-                        p.ask_px_0 ask_px_0,
-                        p.bid_px_0 bid_px_0,
-                        p.ask_px_0 / u.bid_px_0 usd_ask_px_0,
-                        p.bid_px_0 / u.ask_px_0 usd_bid_px_0,
-                        (p.bid_px_0 - {deal_px}) / {deal_px} ret,
-                        {deal_amt} * (p.bid_px_0 / u.ask_px_0) - {entry_usd} pnl_usd
-                    FROM {PRICES_TABLE} p
-                    JOIN {PRICES_TABLE} u ON u.ts = p.ts AND u.instrument = '{usd_instrument}'
-                    WHERE p.instrument = '{instrument}'
-                      AND p.ts BETWEEN DATEADD('m', -{FRAME_MINS}, '{deal_time}')
-                                   AND DATEADD('m', {FRAME_MINS}, '{deal_time}')
-                """
-            else:
-                sql = f"""
-                    INSERT INTO {SLICES_TABLE} (time, instrument, t_from_deal, ask_px_0, bid_px_0, usd_ask_px_0, usd_bid_px_0, ret, pnl_usd)
-                    SELECT
-                        CAST('{deal_time}' AS TIMESTAMP) time,
-                        CAST('{instrument}' AS SYMBOL) instrument,
-                        CAST(extract(epoch from p.ts) - extract(epoch from CAST('{deal_time}' AS TIMESTAMP)) AS INT) t_from_deal,
-                        p.ask_px_0 ask_px_0,
-                        p.bid_px_0 bid_px_0,
-                        p.ask_px_0 / u.bid_px_0 usd_ask_px_0,
-                        p.bid_px_0 / u.ask_px_0 usd_bid_px_0,
-                        ({deal_px} - p.ask_px_0) / {deal_px} ret,
-                        {entry_usd} - {deal_amt} * (p.ask_px_0 / u.bid_px_0) pnl_usd
-                    FROM {PRICES_TABLE} p
-                    JOIN {PRICES_TABLE} u ON u.ts = p.ts AND u.instrument = '{usd_instrument}'
-                    WHERE p.instrument = '{instrument}'
-                      AND p.ts BETWEEN DATEADD('m', -{FRAME_MINS}, '{deal_time}')
-                                   AND DATEADD('m', {FRAME_MINS}, '{deal_time}')
-                """
+        u_series = usd_prices.get(usd_info)
+        if u_series is None:
+            # Nothing to join the slices with
+            return None, no_mids
+
+        # USD rate at deal time from the prefetched series; fall back to a
+        # point query for deals preceding the prefetched window
+        u_ask_0, u_bid_0, found = _usd_rates_at(u_series, deal_ns)
+        for i in np.flatnonzero(~found):
+            rates = _fetch_price_at(cur, usd_instrument, inst_deals['time'].iloc[i].to_pydatetime(),
+                                    is_inverted)
+            if rates:
+                u_ask_0[i], u_bid_0[i] = rates
+                found[i] = True
+        if not found.all():
+            # Deals without a USD price are skipped
+            deal_time, deal_ns, deal_rows = deal_time[found], deal_ns[found], deal_rows[found]
+            deal_amt, deal_px, is_buy = deal_amt[found], deal_px[found], is_buy[found]
+            u_ask_0, u_bid_0 = u_ask_0[found], u_bid_0[found]
+            if not len(deal_ns):
+                return None, no_mids
+
+        # Inverted pairs were inverted in the query (see _quote_columns)
+        rate_ask = u_ask_0
+
+    # Calculate entry_usd (deal volume in USD)
+    # We use the ask rate for the entry valuation (conservative/standard approach?)
+    # Previous code used e.ask_px_0 / eu.bid_px_0 for inverted, which maps to rate_ask.
+    entry_usd = deal_px * deal_amt * rate_ask
+
+    # +/- FRAME_MINS window around each deal (inclusive on both ends), gathered
+    # into one index array: row k of deal d is ts_ns[lo[d] + k]
+    lo = np.searchsorted(ts_ns, deal_ns - FRAME_NS, side='left')
+    hi = np.searchsorted(ts_ns, deal_ns + FRAME_NS, side='right')
+    lens = hi - lo
+    deal_pos = np.repeat(np.arange(len(deal_ns)), lens)
+    idx = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens) + np.repeat(lo, lens)
+    p_ts, p_ask, p_bid = ts_ns[idx], ask[idx], bid[idx]
+
+    if usd_info is None:
+        usd_ask, usd_bid = p_ask, p_bid
+    else:
+        # Inner join with the USD quotes on identical 1s timestamps
+        grid = grids.get(usd_info)
+        if grid is not None:
+            # Both series sit on the 1s grid: the USD quote of a slice row is
+            # read by position (seconds since the grid origin), no key search
+            origin, present, ask_grid, bid_grid = grid
+            off = p_ts - origin
+            slot = off // 1_000_000_000
+            in_grid = (off >= 0) & (off % 1_000_000_000 == 0) & (slot < len(present))
+            in_grid[in_grid] = present[slot[in_grid]]
+            slot = slot[in_grid]
+            ua, ub = ask_grid[slot], bid_grid[slot]
+            matched = in_grid
         else:
-            if deal_side == 'BUY':
-                sql = f"""
-                    INSERT INTO {SLICES_TABLE} (time, instrument, t_from_deal, ask_px_0, bid_px_0, usd_ask_px_0, usd_bid_px_0, ret, pnl_usd)
-                    SELECT
-                        CAST('{deal_time}' AS TIMESTAMP) time,
-                        CAST('{instrument}' AS SYMBOL) instrument,
-                        CAST(extract(epoch from p.ts) - extract(epoch from CAST('{deal_time}' AS TIMESTAMP)) AS INT) t_from_deal,
-                        p.ask_px_0 ask_px_0,
-                        p.bid_px_0 bid_px_0,
-                        p.ask_px_0 * u.ask_px_0 usd_ask_px_0,
-                        p.bid_px_0 * u.bid_px_0 usd_bid_px_0,
-                        (p.bid_px_0 - {deal_px}) / {deal_px} ret,
-                        {deal_amt} * (p.bid_px_0 * u.bid_px_0) - {entry_usd} pnl_usd
-                    FROM {PRICES_TABLE} p
-                    JOIN {PRICES_TABLE} u ON u.ts = p.ts AND u.instrument = '{usd_instrument}'
-                    WHERE p.instrument = '{instrument}'
-                      AND p.ts BETWEEN DATEADD('m', -{FRAME_MINS}, '{deal_time}')
-                                   AND DATEADD('m', {FRAME_MINS}, '{deal_time}')
-                """
-            else:
-                sql = f"""
-                    INSERT INTO {SLICES_TABLE} (time, instrument, t_from_deal, ask_px_0, bid_px_0, usd_ask_px_0, usd_bid_px_0, ret, pnl_usd)
-                    SELECT
-                        CAST('{deal_time}' AS TIMESTAMP) time,
-                        CAST('{instrument}' AS SYMBOL) instrument,
-                        CAST(extract(epoch from p.ts) - extract(epoch from CAST('{deal_time}' AS TIMESTAMP)) AS INT) t_from_deal,
-                        p.ask_px_0 ask_px_0,
-                        p.bid_px_0 bid_px_0,
-                        p.ask_px_0 * u.ask_px_0 usd_ask_px_0,
-                        p.bid_px_0 * u.bid_px_0 usd_bid_px_0,
-                        ({deal_px} - p.ask_px_0) / {deal_px} ret,
-                        {entry_usd} - {deal_amt} * (p.ask_px_0 * u.ask_px_0) pnl_usd
-                    FROM {PRICES_TABLE} p
-                    JOIN {PRICES_TABLE} u ON u.ts = p.ts AND u.instrument = '{usd_instrument}'
-                    WHERE p.instrument = '{instrument}'
-                      AND p.ts BETWEEN DATEADD('m', -{FRAME_MINS}, '{deal_time}')
-                                   AND DATEADD('m', {FRAME_MINS}, '{deal_time}')
-                """
-
-    cur.execute(sql)
-
-
-def _update_amt_usd(cur, deal):
-    """Update amt_usd for a deal from slices at t_from_deal=0."""
-    deal_time = deal['time']
-    instrument = deal['instrument']
-    deal_amt = deal['amt']
-
-    fetch_sql = f"""
-        SELECT (usd_ask_px_0 + usd_bid_px_0) / 2 AS mid_usd
-        FROM {SLICES_TABLE}
-        WHERE time = '{deal_time}' AND instrument = '{instrument}' AND t_from_deal = 0
+            u_ts, u_ask, u_bid = u_series
+            pos = np.searchsorted(u_ts, p_ts)
+            pos_c = np.minimum(pos, len(u_ts) - 1)
+            matched = (pos < len(u_ts)) & (u_ts[pos_c] == p_ts)
+            ua, ub = u_ask[pos_c[matched]], u_bid[pos_c[matched]]
+        p_ts, p_ask, p_bid, deal_pos = p_ts[matched], p_ask[matched], p_bid[matched], deal_pos[matched]
+
+        usd_ask, usd_bid = p_ask * ua, p_bid * ub
+
+    if not len(p_ts):
+        return None, no_mids
+
+    # Broadcast the per-deal scalars to the slice rows
+    px_r, amt_r, entry_r, buy_r = deal_px[deal_pos], deal_amt[deal_pos], entry_usd[deal_pos], is_buy[deal_pos]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret = np.where(buy_r, (p_bid - px_r) / px_r, (px_r - p_ask) / px_r)
+        pnl_usd = np.where(buy_r, amt_r * usd_bid - entry_r, entry_r - amt_r * usd_ask)
+
+    # Whole-second offsets, as extract(epoch ...) differences
+    t_from_deal = (p_ts // 1_000_000_000 - deal_ns[deal_pos] // 1_000_000_000).astype(np.int32)
+
+    # t=0 row of every deal by binary search: rows are ordered by deal, then
+    # by time, so (deal_pos, t_from_deal) packed into one int64 is sorted
+    span = 2 * FRAME_SECS + 3
+    packed = deal_pos.astype(np.int64) * span + (t_from_deal + FRAME_SECS + 1)
+    targets = np.arange(len(deal_ns), dtype=np.int64) * span + (FRAME_SECS + 1)
+    at0 = np.minimum(np.searchsorted(packed, targets), len(packed) - 1)
+    has0 = packed[at0] == targets
+    mids = np.full(len(inst_deals), np.nan)
+    mids[deal_rows[has0]] = (usd_ask[at0[has0]] + usd_bid[at0[has0]]) / 2
+
+    return pd.DataFrame({
+        "time": deal_time[deal_pos],
+        "instrument": instrument,
+        "t_from_deal": t_from_deal,
+        "ask_px_0": p_ask,
+        "bid_px_0": p_bid,
+        "usd_ask_px_0": usd_ask,
+        "usd_bid_px_0": usd_bid,
+        "ret": ret,
+        "pnl_usd": pnl_usd,
+    }, columns=SLICE_COLUMNS), pd.Series(mids, index=inst_deals.index)
+
+
+def _send_slices(slices_df: pd.DataFrame):
+    """Push slices to QuestDB via ILP - serialized column-wise by the client."""
+    try:
+        conf = f'tcp::addr={QUESTDB_HOST}:9009;'
+        with Sender.from_conf(conf) as sender:
+            sender.dataframe(
+                slices_df,
+                table_name=SLICES_TABLE,
+                symbols=['instrument'],
+                at='time'
+            )
+    except IngressError as e:
+        print(f"Error inserting slices via ILP: {e}")
+        raise
+
+
+def _update_amt_usd(cur, deals: pd.DataFrame):
     """
-    cur.execute(fetch_sql)
-    row = cur.fetchone()
-    if row and row[0] is not None:
-        mid_usd = row[0]
-        amt_usd = deal_amt * mid_usd
-        update_sql = f"""
-            UPDATE {DEALS_TABLE}
-            SET amt_usd = {amt_usd}
-            WHERE time = '{deal_time}' AND instrument = '{instrument}'
-        """
-        cur.execute(update_sql)
-
-
-def _update(date_str: str):
-    """Process all deals for a given date."""
-    print(f"Processing decay slices for {date_str}")
+    Update amt_usd of the given deals (computed from their t_from_deal=0 USD mid).
+
+    execute_batch joins UPDATES_PER_BATCH statements into one query string, so
+    a page of updates costs one round-trip to QuestDB instead of one each.
+    """
+    update_sql = f"""
+        UPDATE {DEALS_TABLE}
+        SET amt_usd = %s
+        WHERE time = %s AND instrument = %s
+    """
+    params = zip(deals['amt_usd'].tolist(), deals['time'].dt.to_pydatetime(), deals['instrument'])
+    execute_batch(cur, update_sql, params, page_size=UPDATES_PER_BATCH)
+
 
+def _load_convmap() -> dict:
+    """Load the USD conversion map once; it is static across processed dates."""
     with _connect() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             convmap = _fetch_convmap(cur)
-            print(f"Loaded {len(convmap)} USD conversion mappings")
+    print(f"Loaded {len(convmap)} USD conversion mappings")
+    return convmap
 
-            deals = _fetch_deals(cur, date_str)
-            print(f"Found {len(deals)} deals")
 
-        # Use regular cursor for inserts
+def _update(date_str: str, convmap: dict = None):
+    """
+    Process all deals for a given date.
+
+    `convmap` is the result of _load_convmap(); pass it when processing several
+    dates so the mapping is fetched once per run instead of once per date.
+    """
+    print(f"Processing decay slices for {date_str}")
+    if convmap is None:
+        convmap = _load_convmap()
+
+    with _connect() as conn:
         with conn.cursor() as cur:
-            for idx, deal in enumerate(deals):
-                _process_deal(cur, deal, convmap)
-                if (idx + 1) % 100 == 0:
-                    conn.commit()
-                    print(f"Processed {idx + 1}/{len(deals)} deals")
-            print(f"Processed {len(deals)%100}/{len(deals)} deals")
-            conn.commit()
-
-        # Update amt_usd after all slices are committed
+
+            deals = _fetch_deals(cur, date_str)
+            print(f"Found {len(deals)} deals")
+            if deals.empty:
+                return
+
+            # One windowed fetch covering every traded (and USD-conversion)
+            # instrument instead of one INSERT ... SELECT per deal
+            instruments = set(deals['instrument'])
+            usd_infos = {convmap[i] for i in instruments if i in convmap}
+            instruments |= {u for u, inv in usd_infos if not inv}
+            # Only the quotes inside some deal window are sliced, so the
+            # rest of the day is never shipped from QuestDB
+            windows = _deal_windows(pd.DatetimeIndex(deals['time']).as_unit('ns').asi8)
+            prices = _fetch_prices(cur, sorted(instruments), windows)
+            print(f"Loaded quotes for {len(prices)} instruments")
+
+            # USD rate series per (usd_instrument, is_inverted): plain ones are
+            # the quotes above, inverted ones are inverted by QuestDB
+            inverted = _fetch_prices(cur, sorted(u for u, inv in usd_infos if inv), windows, inverted=True)
+            usd_prices = {
+                (u, inv): (inverted if inv else prices)[u]
+                for u, inv in usd_infos if u in (inverted if inv else prices)
+            }
+            grids = _second_grids(usd_prices)
+
+            # One groupby over the day: each instrument's deals are sliced
+            # DEALS_PER_BATCH at a time (bounding the arrays in memory), and
+            # slices are sent once DEALS_PER_BATCH deals have accumulated
+            mids = []
+            frames, pending, done = [], 0, 0
+            for instrument, inst_deals in deals.groupby('instrument', sort=False):
+                for start in range(0, len(inst_deals), DEALS_PER_BATCH):
+                    chunk = inst_deals.iloc[start:start + DEALS_PER_BATCH]
+                    slices, chunk_mids = _instrument_slices(chunk, instrument, convmap, prices,
+                                                            usd_prices, grids, cur)
+                    if slices is not None:
+                        frames.append(slices)
+                    mids.append(chunk_mids)
+                    pending += len(chunk)
+                    if pending >= DEALS_PER_BATCH:
+                        if frames:
+                            _send_slices(pd.concat(frames, ignore_index=True))
+                        done += pending
+                        frames, pending = [], 0
+                        print(f"Processed {done}/{len(deals)} deals")
+            if frames:
+                _send_slices(pd.concat(frames, ignore_index=True))
+            if pending:
+                print(f"Processed {done + pending}/{len(deals)} deals")
+
+        # Update amt_usd from the t=0 mids computed above (ILP commits
+        # asynchronously, so they are not read back from the slices table)
         print("Updating amt_usd")
+        deals['amt_usd'] = deals['amt'] * pd.concat(mids).reindex(deals.index)
+        updates = deals.dropna(subset=['amt_usd'])
         with conn.cursor() as cur:
-            for idx, deal in enumerate(deals):
-                _update_amt_usd(cur, deal)
-                if (idx + 1) % 100 == 0:
-                    conn.commit()
-            conn.commit()
+            for start in range(0, len(updates), UPDATES_PER_BATCH):
+                _update_amt_usd(cur, updates.iloc[start:start + UPDATES_PER_BATCH])
+                conn.commit()
 
     print(f"Done processing {date_str}")
 
 
 if __name__ == "__main__":
-    for date_str in ["2025-10-20", "2025-10-21", "2025-10-22",
-                    "2025-10-23", "2025-10-24", "2025-10-25",
-                    "2025-10-26", "2025-10-27", "2025-10-28",
-                    "2025-10-29", "2025-10-30"]:
-    # for date_str in ["2025-10-20"]:
-        _update(date_str)
+    dates = ["2025-10-20", "2025-10-21", "2025-10-22",
+             "2025-10-23", "2025-10-24", "2025-10-25",
+             "2025-10-26", "2025-10-27", "2025-10-28",
+             "2025-10-29", "2025-10-30"]
+
+    convmap = _load_convmap()
+    # Dates are independent and mostly wait on QuestDB (quote loads, ILP,
+    # amt_usd updates), so overlap them; each worker holds its own connection.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for _ in executor.map(partial(_update, convmap=convmap), dates):
+            pass
@@ -1,32 +1,14 @@
 import os
-import psycopg2
+from concurrent.futures import ThreadPoolExecutor
 
-# ---------------------------------------------------------------------------
-# QuestDB connection settings
-# ---------------------------------------------------------------------------
-QUESTDB_HOST = os.getenv("QUESTDB_HOST", "16.171.14.188")
-QUESTDB_PORT = int(os.getenv("QUESTDB_PG_PORT", "8812"))
-QUESTDB_USER = os.getenv("QUESTDB_USER", "admin")
-QUESTDB_PASSWORD = os.getenv("QUESTDB_PASSWORD", "quest")
-QUESTDB_DB = os.getenv("QUESTDB_DB", "qdb")
+from _db import close_connections as _close_connections, thread_conn as _thread_conn
 
 SOURCE_TABLE = os.getenv("LATENCY_SOURCE_TABLE", "feed_kraken_tob_5")
 MART_TABLE = os.getenv("LATENCY_MART_TABLE", "mart_kraken_latency")
 STATS_TABLE = os.getenv("LATENCY_STATS_TABLE", "mart_kraken_latency_stats")
 BIN_SIZE_MS = float(os.getenv("LATENCY_BIN_MS", "2"))
 MAX_LATENCY_MS = float(os.getenv("LATENCY_MAX_MS", "200"))
-
-
-def _connect():
-    """Create a new psycopg2 connection to QuestDB's Postgres endpoint."""
-    return psycopg2.connect(
-        host=QUESTDB_HOST,
-        port=QUESTDB_PORT,
-        user=QUESTDB_USER,
-        password=QUESTDB_PASSWORD,
-        database=QUESTDB_DB,
-        connect_timeout=30,
-    )
+MAX_WORKERS = int(os.getenv("LATENCY_MAX_WORKERS", "4"))
 
 
 def _update(date_str: str):
@@ -54,9 +36,9 @@ def _update(date_str: str):
     ORDER BY hour, latency_bin_start_ms
     """
 
-    with _connect() as conn, conn.cursor() as cur:
+    conn = _thread_conn()
+    with conn, conn.cursor() as cur:
         cur.execute(insert_sql)
-        conn.commit()
 
     print(f"Updated {MART_TABLE} for date {date_str}")
 
@@ -86,19 +68,30 @@ def _update_stats(date_str: str):
     WHERE latency_ms >= 0 AND latency_ms <= {MAX_LATENCY_MS}
     """
 
-    with _connect() as conn, conn.cursor() as cur:
+    conn = _thread_conn()
+    with conn, conn.cursor() as cur:
         cur.execute(insert_sql)
-        conn.commit()
 
     print(f"Updated {STATS_TABLE} for date {date_str}")
 
 
+def _update_all(date_str: str):
+    """Populate both the histogram and stats marts for one date."""
+    _update(date_str)
+    _update_stats(date_str)
+
+
 if __name__ == "__main__":
-    from datetime import datetime, timezone
-    date_str = datetime.now(timezone.utc).date().isoformat()
-    for date_str in ["2025-10-20", "2025-10-21", "2025-10-22",
-                    "2025-10-23", "2025-10-24", "2025-10-25",
-                    "2025-10-26", "2025-10-27", "2025-10-28",
-                    "2025-10-29", "2025-10-30"]:
-        _update(date_str)
-        _update_stats(date_str)
\ No newline at end of file
+    dates = ["2025-10-20", "2025-10-21", "2025-10-22",
+             "2025-10-23", "2025-10-24", "2025-10-25",
+             "2025-10-26", "2025-10-27", "2025-10-28",
+             "2025-10-29", "2025-10-30"]
+
+    # Dates are independent and the work runs inside QuestDB, so overlap them;
+    # each worker reuses one connection for all its statements.
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for _ in executor.map(_update_all, dates):
+                pass
+    finally:
+        _close_connections()
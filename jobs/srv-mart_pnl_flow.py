@@ -2,7 +2,7 @@ import os
 import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine
-from questdb.ingress import Sender, IngressError, TimestampNanos
+from questdb.ingress import Sender, IngressError
 
 # Configure pandas display options
 pd.set_option('display.max_columns', None)
@@ -25,6 +25,9 @@ SOURCE_FEED_TABLE = os.getenv("PNL_FLOW_FEED_TABLE", "feed_kraken_1m")
 MART_TABLE = os.getenv("PNL_FLOW_MART_TABLE", "mart_pnl_flow")
 CONVMAP_TABLE = os.getenv("CONVMAP_TABLE", "map_decomposition_usd")
 
+# Low-cardinality symbol columns of the fetched flow frame
+CATEGORY_COLUMNS = ("instrument", "instrument_base", "instrument_quote", "instrument_usd")
+
 
 def _connect():
     """Create a SQLAlchemy engine for QuestDB's Postgres endpoint."""
@@ -36,22 +39,10 @@ def _get_prev_cumsum(engine, date_str: str):
     """Fetch the last cumulative values before the target date for each instrument."""
     date_start = f"{date_str}T00:00:00.000000Z"
 
+    # LATEST ON picks each instrument's last row before the date with a
+    # backward scan of the designated timestamp, instead of numbering every
+    # historical row through a ROW_NUMBER() window sort
     query = f"""
-    WITH ranked AS (
-        SELECT
-            instrument,
-            cum_amt,
-            cum_cost_usd,
-            cum_cost_base,
-            cum_cost_quote,
-            cum_cost_native,
-            cum_quote_amt,
-            cum_vol_usd,
-            cum_rpnl_usd,
-            ROW_NUMBER() OVER (PARTITION BY instrument ORDER BY ts DESC) as rn
-        FROM {MART_TABLE}
-        WHERE ts < '{date_start}'
-    )
     SELECT
         instrument,
         cum_amt,
@@ -62,8 +53,9 @@ def _get_prev_cumsum(engine, date_str: str):
         cum_quote_amt,
         cum_vol_usd,
         cum_rpnl_usd
-    FROM ranked
-    WHERE rn = 1
+    FROM {MART_TABLE}
+    WHERE ts < '{date_start}'
+    LATEST ON ts PARTITION BY instrument
     """
 
     try:
@@ -85,7 +77,7 @@ def _get_prev_cumsum(engine, date_str: str):
 
 def _forward_fill_by_instrument(df, series):
     """Forward fill a series grouping by instrument."""
-    return series.groupby(df['instrument']).ffill()
+    return series.groupby(df['instrument'], observed=True).ffill()
 
 
 def _convert_to_usd(df, native_values, usd_bid, usd_ask, inv_flag, value_type='positive'):
@@ -94,23 +86,28 @@ def _convert_to_usd(df, native_values, usd_bid, usd_ask, inv_flag, value_type='p
 
     value_type: 'positive' uses bid for positive values and ask for negative
                 'mid' uses mid price
+
+    Runs as flat NumPy array arithmetic (one np.where chain) rather than six
+    masked Series assignments.
     """
-    has_usd = df['instrument_usd'].notna()
-    result = native_values.copy()
+    native = native_values.to_numpy(dtype=float)
+    bid = np.asarray(usd_bid, dtype=float)
+    ask = np.asarray(usd_ask, dtype=float)
+    has_usd = df['instrument_usd'].notna().to_numpy()
+    inv = np.asarray(inv_flag, dtype=bool)
 
     if value_type == 'mid':
-        usd_mid = (usd_bid + usd_ask) / 2
-        result[has_usd & ~inv_flag] = native_values * usd_mid
-        result[has_usd & inv_flag] = native_values / usd_mid
+        rate = (bid + ask) / 2
+        convert = has_usd
     else:
-        positive = native_values > 0
-        negative = native_values < 0
-        result[has_usd & ~inv_flag & positive] = native_values * usd_bid
-        result[has_usd & ~inv_flag & negative] = native_values * usd_ask
-        result[has_usd & inv_flag & positive] = native_values / usd_bid
-        result[has_usd & inv_flag & negative] = native_values / usd_ask
+        rate = np.where(native > 0, bid, ask)
+        # Zero and NaN values have no side and stay as they are
+        convert = has_usd & ((native > 0) | (native < 0))
 
-    return result.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        converted = np.where(inv, native / rate, native * rate)
+
+    return pd.Series(np.where(convert, converted, native), index=native_values.index)
 
 
 def _get_position_conditions(amounts):
@@ -127,8 +124,8 @@ def _calculate_realized_pnl(df, amt_col, cost_col, market_px_usd, rpnl_base):
     Calculate realized PnL from position changes (reductions/flips).
     Reusable for both instrument and quote legs.
     """
-    prev_amt = df.groupby('instrument')[amt_col].shift(1)
-    prev_cost = df.groupby('instrument')[cost_col].shift(1)
+    prev_amt = df.groupby('instrument', observed=True)[amt_col].shift(1)
+    prev_cost = df.groupby('instrument', observed=True)[cost_col].shift(1)
 
     avg_cost = prev_cost / prev_amt
 
@@ -163,7 +160,7 @@ def _initialize_cumulative_columns(df, prev_cumsum, columns):
     for col in columns:
         prev_col = f'prev_day_{col}'
         if not prev_cumsum.empty and col in prev_cumsum.columns:
-            df[prev_col] = df['instrument'].map(prev_cumsum[col]).fillna(0)
+            df[prev_col] = df['instrument'].map(prev_cumsum[col]).astype(float).fillna(0)
         else:
             df[prev_col] = 0
     return df
@@ -181,7 +178,7 @@ def _compute_cumsum_with_carryover(df, prev_cumsum, flow_columns):
 
     for cum_col, flow_col in flow_columns.items():
         prev_col = f'prev_day_{cum_col}'
-        df[cum_col] = df[prev_col] + df.groupby('instrument')[flow_col].cumsum()
+        df[cum_col] = df[prev_col] + df.groupby('instrument', observed=True)[flow_col].cumsum()
 
     # Drop temporary columns
     df = df.drop(columns=[f'prev_day_{col}' for col in cum_cols])
@@ -327,6 +324,12 @@ SELECT * FROM base;
 
     print(f"Retrieved {len(df)} rows for date {date_str}")
 
+    # Instrument symbols repeat on every minute bucket: as categoricals the
+    # per-instrument groupbys below hash small integer codes, not strings
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
     # Sort data by instrument and timestamp
     df = df.sort_values(['instrument', 'ts'])
 
@@ -383,13 +386,13 @@ SELECT * FROM base;
     mask_buy = df['amt_buy'] > 0
     mask_sell = df['amt_sell'] > 0
 
-    # Convert buy/sell prices to USD
-    px_buy_usd = df['px_buy'].copy()
-    px_sell_usd = df['px_sell'].copy()
-    px_buy_usd[has_usd & inv] = df['px_buy'][has_usd & inv] / usd_bid[has_usd & inv]
-    px_buy_usd[has_usd & ~inv] = df['px_buy'][has_usd & ~inv] * usd_bid[has_usd & ~inv]
-    px_sell_usd[has_usd & inv] = df['px_sell'][has_usd & inv] / usd_ask[has_usd & inv]
-    px_sell_usd[has_usd & ~inv] = df['px_sell'][has_usd & ~inv] * usd_ask[has_usd & ~inv]
+    # Convert buy/sell prices to USD (computed into fresh arrays, no column copies)
+    usd_inv = has_usd & inv
+    usd_dir = has_usd & ~inv
+    px_buy_usd = np.where(usd_inv, df['px_buy'] / usd_bid,
+                          np.where(usd_dir, df['px_buy'] * usd_bid, df['px_buy']))
+    px_sell_usd = np.where(usd_inv, df['px_sell'] / usd_ask,
+                           np.where(usd_dir, df['px_sell'] * usd_ask, df['px_sell']))
 
     # Signed costs
     df['cost_signed_usd'] = (df['amt_buy'] * px_buy_usd - df['amt_sell'] * px_sell_usd).fillna(0.0).astype(float)
@@ -427,14 +430,11 @@ SELECT * FROM base;
     # ---------------------------------------------------------------------------
     # Instrument bid/ask in USD
     # ---------------------------------------------------------------------------
-    df['instrument_bid_usd'] = df['px_bid_0'].copy()
-    df['instrument_ask_usd'] = df['px_ask_0'].copy()
-
     usd_mid = (usd_bid + usd_ask) / 2
-    df.loc[has_usd & inv, 'instrument_bid_usd'] = df['px_bid_0'] / usd_mid
-    df.loc[has_usd & inv, 'instrument_ask_usd'] = df['px_ask_0'] / usd_mid
-    df.loc[has_usd & ~inv, 'instrument_bid_usd'] = df['px_bid_0'] * usd_mid
-    df.loc[has_usd & ~inv, 'instrument_ask_usd'] = df['px_ask_0'] * usd_mid
+    df['instrument_bid_usd'] = np.where(usd_inv, df['px_bid_0'] / usd_mid,
+                                        np.where(usd_dir, df['px_bid_0'] * usd_mid, df['px_bid_0']))
+    df['instrument_ask_usd'] = np.where(usd_inv, df['px_ask_0'] / usd_mid,
+                                        np.where(usd_dir, df['px_ask_0'] * usd_mid, df['px_ask_0']))
 
     df['instrument_bid_usd'] = _forward_fill_by_instrument(df, df['instrument_bid_usd'])
     df['instrument_ask_usd'] = _forward_fill_by_instrument(df, df['instrument_ask_usd'])
@@ -442,7 +442,7 @@ SELECT * FROM base;
     # ---------------------------------------------------------------------------
     # Realized PnL (instrument leg)
     # ---------------------------------------------------------------------------
-    prev_cum_amt = df.groupby('instrument')['cum_amt'].shift(1)
+    prev_cum_amt = df.groupby('instrument', observed=True)['cum_amt'].shift(1)
     prev_long = prev_cum_amt > 0
     market_px_usd = np.where(prev_long, df['instrument_bid_usd'], df['instrument_ask_usd'])
 
@@ -489,15 +489,15 @@ SELECT * FROM base;
     # Realized PnL (quote leg)
     # ---------------------------------------------------------------------------
     # Convert intraday rpnl_intra to USD
-    rpnl_intra_usd = df['rpnl_intra'].copy()
-    rpnl_pos = df['rpnl_intra'] > 0
-    rpnl_neg = df['rpnl_intra'] < 0
-    rpnl_intra_usd[rpnl_pos] = df['rpnl_intra'][rpnl_pos] * quote_bid[rpnl_pos]
-    rpnl_intra_usd[rpnl_neg] = df['rpnl_intra'][rpnl_neg] * quote_ask[rpnl_neg]
-    rpnl_intra_usd = rpnl_intra_usd.fillna(0.0)
+    rpnl_intra = df['rpnl_intra']
+    rpnl_intra_usd = pd.Series(
+        np.where(rpnl_intra > 0, rpnl_intra * quote_bid,
+                 np.where(rpnl_intra < 0, rpnl_intra * quote_ask, rpnl_intra)),
+        index=df.index
+    ).fillna(0.0)
 
     # Calculate quote market price
-    prev_cum_quote = df.groupby('instrument')['cum_quote_amt'].shift(1)
+    prev_cum_quote = df.groupby('instrument', observed=True)['cum_quote_amt'].shift(1)
     prev_quote_long = prev_cum_quote > 0
     quote_market_px_usd = np.where(prev_quote_long, quote_bid, quote_ask)
 
@@ -505,7 +505,7 @@ SELECT * FROM base;
         df, 'cum_quote_amt', 'cum_cost_quote', quote_market_px_usd, rpnl_intra_usd
     )
 
-    df['cum_rpnl_quote'] = df.groupby('instrument')['rpnl_quote_total'].cumsum().astype(float)
+    df['cum_rpnl_quote'] = df.groupby('instrument', observed=True)['rpnl_quote_total'].cumsum().astype(float)
 
     # ---------------------------------------------------------------------------
     # Total and unrealized PnL (quote leg)
@@ -552,50 +552,23 @@ def _update(date_str: str):
 
     df_to_insert[float_cols] = df_to_insert[float_cols].fillna(0.0).astype(float)
     df_to_insert[int_cols] = df_to_insert[int_cols].fillna(0).astype(int)
-    df_to_insert[symbol_cols] = df_to_insert[symbol_cols].astype(str)
+    # Missing base/quote legs are sent as null symbols (skipped by ILP)
+    for col in symbol_cols:
+        df_to_insert[col] = df_to_insert[col].astype(object).where(df_to_insert[col].notna(), None)
+    df_to_insert['ts'] = pd.to_datetime(df_to_insert['ts'])
 
     print(f"Inserting {len(df_to_insert)} rows to {MART_TABLE}")
 
-    # Insert via ILP
+    # Insert via ILP - the whole frame is serialized column-wise by the client
     try:
         conf = f'tcp::addr={QUESTDB_HOST}:9009;'
         with Sender.from_conf(conf) as sender:
-            for _, row in df_to_insert.iterrows():
-                ts_nanos = TimestampNanos(int(pd.Timestamp(row['ts']).value))
-
-                sender.row(
-                    MART_TABLE,
-                    symbols={
-                        'instrument': row['instrument'],
-                        'instrument_base': row['instrument_base'] if row['instrument_base'] != 'nan' else None,
-                        'instrument_quote': row['instrument_quote'] if row['instrument_quote'] != 'nan' else None
-                    },
-                    columns={
-                        'amt_base': row['amt_base'],
-                        'px': row['px'],
-                        'px_quote': row['px_quote'],
-                        'px_base': row['px_base'],
-                        'vol_usd': row['vol_usd'],
-                        'num_deals': row['num_deals'],
-                        'cum_amt': row['cum_amt'],
-                        'cum_cost_usd': row['cum_cost_usd'],
-                        'cum_cost_base': row['cum_cost_base'],
-                        'cum_cost_quote': row['cum_cost_quote'],
-                        'cum_cost_native': row['cum_cost_native'],
-                        'cum_quote_amt': row['cum_quote_amt'],
-                        'cum_vol_usd': row['cum_vol_usd'],
-                        'rpnl_usd_total': row['rpnl_usd_total'],
-                        'cum_rpnl_usd': row['cum_rpnl_usd'],
-                        'cum_rpnl_quote': row['cum_rpnl_quote'],
-                        'upnl_usd': row['upnl_usd'],
-                        'upnl_base': row['upnl_base'],
-                        'upnl_quote': row['upnl_quote'],
-                        'tpnl_usd': row['tpnl_usd'],
-                        'tpnl_quote': row['tpnl_quote']
-                    },
-                    at=ts_nanos
-                )
-
+            sender.dataframe(
+                df_to_insert,
+                table_name=MART_TABLE,
+                symbols=symbol_cols,
+                at='ts'
+            )
             sender.flush()
 
         print(f"Successfully inserted {len(df_to_insert)} rows for {date_str}")
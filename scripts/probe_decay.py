@@ -0,0 +1,43 @@
+"""
+Probe the decay widget's dataset build against QuestDB.
+
+Runs decay._build_dataset for a datetime range and prints what came back.
+Kept out of the widget module so importing it never issues live queries.
+
+Usage:
+    python scripts/probe_decay.py 2025-10-28 [2025-10-28] [--view usd_pnl]
+"""
+
+import argparse
+import os
+import sys
+
+# The app imports its widgets as a top-level package from app/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from widgets import decay  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch decay deals/slices and print a summary.")
+    parser.add_argument("start", help="Start datetime ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS')")
+    parser.add_argument("end", nargs="?", help="End datetime (defaults to start)")
+    parser.add_argument("--view", choices=("return", "usd_pnl"), default="return")
+    args = parser.parse_args()
+
+    deals_df, slices_df = decay._build_dataset(args.start, args.end or args.start, args.view)
+    print(f"\nDeals: {len(deals_df)}")
+    print(f"Slice rows: {len(slices_df)}")
+
+    if not deals_df.empty:
+        print("\nFirst few deals:")
+        print(deals_df.head())
+
+    if not slices_df.empty:
+        first_idx = slices_df['deal_id'].iloc[0]
+        print(f"\nFirst slice (deal idx={first_idx}):")
+        print(slices_df[slices_df['deal_id'] == first_idx].head())
+
+
+if __name__ == "__main__":
+    main()
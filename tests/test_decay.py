@@ -0,0 +1,61 @@
+"""
+Smoke test for the decay widget's dataset build, with QuestDB stubbed out.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+for _module in ("dash", "plotly", "psycopg2", "requests"):
+    pytest.importorskip(_module)
+
+# The app imports its widgets as a top-level package from app/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from widgets import decay  # noqa: E402
+
+
+def _deals():
+    time = pd.to_datetime(["2025-10-28 10:00:00", "2025-10-28 10:00:00", "2025-10-28 11:00:00"], utc=True)
+    return pd.DataFrame({
+        "time": time,
+        "instrument": pd.Categorical(["BTC/USD", "BTC/USD", "ETH/USD"]),
+        "side": pd.Categorical(["buy", "sell", "buy"]),
+        "orderKind": pd.Categorical(["market"] * 3),
+        "orderType": pd.Categorical(["limit"] * 3),
+        "tif": pd.Categorical(["GTC"] * 3),
+    })
+
+
+def _slices(start_datetime, end_datetime, view="return", instruments=None):
+    time = pd.to_datetime(["2025-10-28 10:00:00"] * 3 + ["2025-10-28 11:00:00"] * 3, utc=True)
+    df = pd.DataFrame({
+        "time": time,
+        "instrument": pd.Categorical(["BTC/USD"] * 3 + ["ETH/USD"] * 3),
+        "t_from_deal": np.array([-1, 0, 1] * 2, dtype=np.int16),
+        "ret" if view == "return" else "pnl_usd": np.arange(6, dtype=np.float32),
+    })
+    if instruments:
+        df = df[df["instrument"].isin(instruments)].reset_index(drop=True)
+    return df
+
+
+@pytest.fixture
+def stub_db(monkeypatch):
+    monkeypatch.setattr(decay, "_fetch_deals", lambda *args, **kwargs: _deals())
+    monkeypatch.setattr(decay, "_fetch_slices", _slices)
+
+
+@pytest.mark.parametrize("filters", [None, {"instruments": ["ETH/USD"]}])
+def test_build_dataset(stub_db, filters):
+    deals_df, slices_df = decay._build_dataset("2025-10-28", "2025-10-28", "return", filters)
+
+    assert len(deals_df) == 3
+    assert list(slices_df.columns) == list(decay.SLICE_FRAME_COLUMNS)
+    expected_deals = [2] if filters else [0, 1, 2]
+    assert sorted(slices_df["deal_id"].unique()) == expected_deals
+    runs = slices_df.groupby("deal_id")["t_from_deal"].apply(list).tolist()
+    assert runs == [[-1, 0, 1]] * len(expected_deals)